@@ -1,33 +1,81 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Header, Request, Depends, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel, EmailStr
-import smtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from email.mime.base import MIMEBase
-from email import encoders
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, EmailStr, ValidationError
 import os
+import asyncio
+from contextlib import asynccontextmanager
 from datetime import datetime
 import logging
+import json
+import mimetypes
+import sqlite3
+import time
+import zipfile
 from typing import Optional
-import aiofiles
-import uuid
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Local modules read their settings at import time, so import them after load_dotenv()
+from mailer import shutdown_mail_executor, transports as mail_transports
+from outbox import outbox
+from uploads import UploadTooLarge
+from resume_store import resume_store, blob_path
+import resume_links
+from application_store import application_store
+from bulk_import import ZipMember, detect_format, iter_rows, run_import
+from templating import templates
+from contact_digest import ContactDigest
+from idempotency import header_key, payload_key, idempotency_cache
+from ingress import IngressLimiter, bearer_status
+from file_responses import content_disposition, file_response
+from static_site import static_site
+from log_config import RequestIdMiddleware, configure_logging
+import metrics
+from metrics import MetricsMiddleware, parse_elapsed, stage_timer
+import outbox as outbox_db
+
+# Configure logging: records are queued and written by a background thread (see log_config.py)
+configure_logging()
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await outbox.start()
+    await contact_digest.start()
+    await resume_store.start()
+    await application_store.start()
+    await static_site.start()
+    metrics_flusher = asyncio.create_task(metrics.flush_periodically())
+    yield
+    metrics_flusher.cancel()
+    await application_store.stop()
+    await resume_store.stop()
+    await contact_digest.stop()
+    await outbox.stop()
+    # Let in-flight emails finish before the worker exits
+    shutdown_mail_executor(wait=True)
+    metrics.flush()
+
 app = FastAPI(
     title="Talvyn Technologies Backend API",
     description="Backend API for job applications and contact forms",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+# Bearer token for the submission search endpoints; they are disabled while it is unset
+ADMIN_API_TOKEN = os.getenv("ADMIN_API_TOKEN", "")
+# Bearer tokens (comma separated) recruiting partners use for bulk imports; ADMIN_API_TOKEN works too
+PARTNER_API_TOKENS = [token.strip() for token in os.getenv("PARTNER_API_TOKENS", "").split(",") if token.strip()]
+
+# Per-client rate limits and load shedding for the submission routes; added
+# before CORS so that rejections still carry CORS headers. Bulk imports are
+# refused without a partner token before their (large) body is read.
+app.add_middleware(IngressLimiter, auth={"/api/job-applications/bulk": [ADMIN_API_TOKEN, *PARTNER_API_TOKENS]})
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -35,15 +83,39 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID"],
 )
 
+# Request counts and arrival timestamps; outermost so it sees every request
+app.add_middleware(MetricsMiddleware)
+
+# Request IDs for log records and the X-Request-ID response header; outermost so every log line gets one
+app.add_middleware(RequestIdMiddleware)
+
 # Email configuration
-SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp-mail.outlook.com")
-SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
-SMTP_USERNAME = os.getenv("SMTP_USERNAME", "")
-SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "")
 HR_EMAIL = os.getenv("HR_EMAIL", "hr@talvyntechnologies.com")
 
+# Optionally batch contact inquiries into one HR email (CONTACT_DIGEST_ENABLED)
+contact_digest = ContactDigest(HR_EMAIL)
+
+
+def _check_bearer(authorization: Optional[str], tokens):
+    status_code = bearer_status(authorization, tokens)
+    if status_code == 404:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if status_code == 401:
+        raise HTTPException(status_code=401, detail="Invalid or missing API token", headers={"WWW-Authenticate": "Bearer"})
+
+
+def require_admin(authorization: Optional[str] = Header(None)):
+    """Dependency guarding the endpoints that expose stored submissions"""
+    _check_bearer(authorization, [ADMIN_API_TOKEN])
+
+
+def require_partner(authorization: Optional[str] = Header(None)):
+    """Dependency guarding the bulk import endpoint"""
+    _check_bearer(authorization, [ADMIN_API_TOKEN, *PARTNER_API_TOKENS])
+
 # Data models
 class ContactForm(BaseModel):
     name: str
@@ -65,273 +137,66 @@ class JobApplication(BaseModel):
     skills: str
     coverLetter: str
 
-# Utility functions
-def send_email(to_email: str, subject: str, body: str, attachment_path: str = None, reply_to: str = None, from_name: str = None):
-    """Send email with improved delivery and spam prevention"""
-    try:
-        logger.info(f"Attempting to send email to {to_email}")
-        logger.info(f"SMTP Server: {SMTP_SERVER}:{SMTP_PORT}")
-        logger.info(f"SMTP Username: {SMTP_USERNAME}")
-        
-        msg = MIMEMultipart('related')
-        
-        # Improved headers for better deliverability
-        msg['From'] = f"Talvyn Technologies <{SMTP_USERNAME}>"
-        msg['To'] = to_email
-        msg['Subject'] = subject
-        msg['Message-ID'] = f"<{uuid.uuid4()}@talvyntechnologies.com>"
-        msg['Date'] = datetime.now().strftime("%a, %d %b %Y %H:%M:%S %z")
-        
-        # Add important headers for spam prevention
-        msg['X-Mailer'] = 'Talvyn Technologies Application v1.0'
-        msg['X-Priority'] = '3'
-        msg['Importance'] = 'Normal'
-        
-        if reply_to:
-            msg['Reply-To'] = reply_to
-            logger.info(f"Reply-To set to: {reply_to}")
-        
-        # Create HTML body with better structure
-        html_body = f"""
-        <!DOCTYPE html>
-        <html lang="en">
-        <head>
-            <meta charset="UTF-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <title>{subject}</title>
-        </head>
-        <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
-            {body}
-            <br>
-            <hr style="border: 1px solid #ddd; margin: 20px 0;">
-            <p style="font-size: 12px; color: #666;">
-                This email was sent from Talvyn Technologies contact system.<br>
-                If you did not expect this email, please ignore it.
-            </p>
-        </body>
-        </html>
-        """
-        
-        msg.attach(MIMEText(html_body, 'html', 'utf-8'))
-        
-        # Add attachment if provided
-        if attachment_path and os.path.exists(attachment_path):
-            with open(attachment_path, "rb") as attachment:
-                part = MIMEBase('application', 'octet-stream')
-                part.set_payload(attachment.read())
-                encoders.encode_base64(part)
-                part.add_header(
-                    'Content-Disposition',
-                    f'attachment; filename="{os.path.basename(attachment_path)}"'
-                )
-                msg.attach(part)
-        
-        logger.info("Connecting to SMTP server...")
-        
-        # Try different connection methods for better AWS compatibility
-        try:
-            # Primary method - SMTP with STARTTLS
-            server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT, timeout=30)
-            server.starttls()
-        except:
-            # Fallback method - SMTP_SSL
-            try:
-                server = smtplib.SMTP_SSL(SMTP_SERVER, 465, timeout=30)
-            except:
-                # Final fallback
-                server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT, timeout=30)
-                server.starttls()
-        
-        logger.info("Attempting login...")
-        server.login(SMTP_USERNAME, SMTP_PASSWORD)
-        
-        logger.info("Sending message...")
-        # Use send_message for better header handling
-        refused = server.send_message(msg)
-        
-        if refused:
-            logger.warning(f"Some recipients were refused: {refused}")
-        
-        server.quit()
-        
-        logger.info(f"Email sent successfully to {to_email}")
-        
-        # Add delay to prevent rate limiting
-        import time
-        time.sleep(1)
-        
-        return True
-        
-    except smtplib.SMTPRecipientsRefused as e:
-        logger.error(f"Recipients refused for {to_email}: {str(e)}")
-        logger.error("Check if recipient email address is valid")
-        return False
-    except smtplib.SMTPAuthenticationError as e:
-        logger.error(f"SMTP Authentication failed for {to_email}: {str(e)}")
-        logger.error("Check SMTP credentials and app password")
-        return False
-    except smtplib.SMTPDataError as e:
-        logger.error(f"SMTP Data error for {to_email}: {str(e)}")
-        logger.error("Email content may be rejected as spam")
-        return False
-    except smtplib.SMTPException as e:
-        logger.error(f"SMTP error sending email to {to_email}: {str(e)}")
-        return False
-    except Exception as e:
-        logger.error(f"Unexpected error sending email to {to_email}: {str(e)}")
-        logger.error(f"Error type: {type(e).__name__}")
-        return False
-
-def generate_hr_job_email(application: JobApplication, resume_filename: str):
-    """Generate HTML email for HR about new job application"""
-    return f"""
-    <html>
-        <head>
-            <style>
-                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-                .header {{ background-color: #00704A; color: white; padding: 20px; text-align: center; }}
-                .content {{ padding: 20px; }}
-                .section {{ margin-bottom: 20px; padding: 15px; border-left: 4px solid #00704A; background-color: #f9f9f9; }}
-                .label {{ font-weight: bold; color: #00704A; }}
-                .footer {{ background-color: #f0f0f0; padding: 15px; text-align: center; font-size: 12px; }}
-            </style>
-        </head>
-        <body>
-            <div class="header">
-                <h2>New Job Application - Talvyn Technologies</h2>
-            </div>
-            
-            <div class="content">
-                <div class="section">
-                    <h3>Candidate Information</h3>
-                    <p><span class="label">Name:</span> {application.name}</p>
-                    <p><span class="label">Email:</span> {application.email}</p>
-                    <p><span class="label">Phone:</span> {application.phone}</p>
-                    <p><span class="label">Position Applied:</span> {application.position}</p>
-                </div>
-                
-                <div class="section">
-                    <h3>Professional Details</h3>
-                    <p><span class="label">Experience:</span> {application.experience}</p>
-                    <p><span class="label">Current Company:</span> {application.currentCompany}</p>
-                    <p><span class="label">Expected Salary:</span> {application.expectedSalary}</p>
-                    <p><span class="label">Notice Period:</span> {application.noticePeriod}</p>
-                    <p><span class="label">Skills:</span> {application.skills}</p>
-                </div>
-                
-                <div class="section">
-                    <h3>Cover Letter</h3>
-                    <p>{application.coverLetter}</p>
-                </div>
-                
-                <div class="section">
-                    <p><span class="label">Resume:</span> {resume_filename} (attached)</p>
-                    <p><span class="label">Application Date:</span> {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
-                </div>
-            </div>
-            
-            <div class="footer">
-                <p>This application was submitted through Talvyn Technologies career portal.</p>
-            </div>
-        </body>
-    </html>
-    """
+# Email templates
+def render_resume_line(resume_filename: str, resume_link: tuple, resume_size: int, fallback: str):
+    """The (html, text) resume line: a download link when there is one, else the fallback partial"""
+    if not resume_link:
+        return templates.render(fallback, resume_filename=resume_filename)
+    url, expires = resume_link
+    return templates.render(
+        "_resume_link",
+        resume_filename=resume_filename,
+        resume_url=url,
+        resume_size=f"{resume_size / (1024 * 1024):.1f} MB",
+        expires_at=resume_links.format_expiry(expires)
+    )
 
-def generate_candidate_confirmation_email(name: str, position: str):
-    """Generate confirmation email for candidate"""
-    return f"""
-    <html>
-        <head>
-            <style>
-                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-                .header {{ background-color: #00704A; color: white; padding: 20px; text-align: center; }}
-                .content {{ padding: 20px; }}
-                .highlight {{ background-color: #e8f5e8; padding: 15px; border-radius: 5px; margin: 15px 0; }}
-                .footer {{ background-color: #f0f0f0; padding: 15px; text-align: center; }}
-            </style>
-        </head>
-        <body>
-            <div class="header">
-                <h2>Application Received - Talvyn Technologies</h2>
-            </div>
-            
-            <div class="content">
-                <h3>Dear {name},</h3>
-                
-                <p>Thank you for your interest in joining Talvyn Technologies!</p>
-                
-                <div class="highlight">
-                    <p><strong>Your application for the position of "{position}" has been successfully received.</strong></p>
-                </div>
-                
-                <p>Here's what happens next:</p>
-                <ul>
-                    <li>Our HR team will review your application within 2-3 business days</li>
-                    <li>If your profile matches our requirements, we'll contact you for the next steps</li>
-                    <li>You can expect to hear back from us within a week</li>
-                </ul>
-                
-                <p>We appreciate your patience during our review process.</p>
-                
-                <p>If you have any questions, feel free to reach out to us at <a href="mailto:hr@talvyntechnologies.com">hr@talvyntechnologies.com</a></p>
-                
-                <p>Best regards,<br>
-                <strong>HR Team</strong><br>
-                Talvyn Technologies</p>
-            </div>
-            
-            <div class="footer">
-                <p>© 2024 Talvyn Technologies. All rights reserved.</p>
-            </div>
-        </body>
-    </html>
+def generate_hr_job_email(application: JobApplication, resume_filename: str, subject: str, resume_link: tuple = None, resume_size: int = None):
+    """Render the HR email about a new job application, returning (html, text)
+
+    resume_link is the (url, expires) of a download link, for resumes that are not attached.
     """
+    resume = render_resume_line(resume_filename, resume_link, resume_size, "_resume_attached")
+    context = {
+        "subject": subject,
+        "submitted_at": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        **application.model_dump()
+    }
+    return templates.render_with("hr_job_application", {"resume": resume}, **context)
 
-def generate_hr_contact_email(contact: ContactForm):
-    """Generate HTML email for HR about new contact inquiry"""
-    return f"""
-    <html>
-        <head>
-            <style>
-                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-                .header {{ background-color: #00704A; color: white; padding: 20px; text-align: center; }}
-                .content {{ padding: 20px; }}
-                .section {{ margin-bottom: 20px; padding: 15px; border-left: 4px solid #00704A; background-color: #f9f9f9; }}
-                .label {{ font-weight: bold; color: #00704A; }}
-                .footer {{ background-color: #f0f0f0; padding: 15px; text-align: center; font-size: 12px; }}
-            </style>
-        </head>
-        <body>
-            <div class="header">
-                <h2>New Contact Inquiry - Talvyn Technologies</h2>
-            </div>
-            
-            <div class="content">
-                <div class="section">
-                    <h3>Contact Information</h3>
-                    <p><span class="label">Name:</span> {contact.name}</p>
-                    <p><span class="label">Email:</span> {contact.email}</p>
-                    <p><span class="label">Phone:</span> {contact.phone}</p>
-                    <p><span class="label">Company:</span> {contact.company}</p>
-                    <p><span class="label">Service Interest:</span> {contact.serviceInterest}</p>
-                </div>
-                
-                <div class="section">
-                    <h3>Message</h3>
-                    <p>{contact.message}</p>
-                </div>
-                
-                <div class="section">
-                    <p><span class="label">Inquiry Date:</span> {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
-                </div>
-            </div>
-            
-            <div class="footer">
-                <p>This inquiry was submitted through Talvyn Technologies contact form.</p>
-            </div>
-        </body>
-    </html>
+def generate_candidate_confirmation_email(name: str, position: str, subject: str):
+    """Render the confirmation email for the candidate, returning (html, text)"""
+    return templates.render("candidate_confirmation", subject=subject, name=name, position=position)
+
+def generate_hr_contact_email(contact: ContactForm, subject: str):
+    """Render the HR email about a new contact inquiry, returning (html, text)"""
+    return templates.render(
+        "hr_contact",
+        subject=subject,
+        submitted_at=datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        **contact.model_dump()
+    )
+
+def generate_hr_bulk_import_email(candidates: list, source: str, rejected: int, subject: str):
+    """Render the HR summary of one bulk import, returning (html, text)
+
+    Each candidate carries resume_filename and, when its resume can be
+    downloaded, resume_link and resume_size.
     """
+    items = []
+    for n, candidate in enumerate(candidates, 1):
+        resume = render_resume_line(
+            candidate["resume_filename"], candidate.get("resume_link"), candidate.get("resume_size"), "_resume_name"
+        )
+        items.append(templates.render_with("_hr_bulk_import_item", {"resume": resume}, number=n, **candidate))
+    context = {
+        "subject": subject,
+        "count": len(candidates),
+        "rejected": rejected,
+        "source": source,
+        "imported_at": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+    }
+    return templates.render_with("hr_bulk_import", {"candidates": items}, **context)
 
 # API Endpoints
 @app.post("/api/job-application")
@@ -346,9 +211,12 @@ async def submit_job_application(
     noticePeriod: str = Form(...),
     skills: str = Form(...),
     coverLetter: str = Form(...),
-    resume: UploadFile = File(...)
+    resume: UploadFile = File(...),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    request: Request = None
 ):
     """Handle job application submission"""
+    parse_elapsed(request)
     try:
         # Validate file type
         allowed_types = ['application/pdf', 'application/msword', 
@@ -356,19 +224,6 @@ async def submit_job_application(
         if resume.content_type not in allowed_types:
             raise HTTPException(status_code=400, detail="Only PDF and DOC/DOCX files are allowed")
         
-        # Generate unique filename
-        file_extension = resume.filename.split('.')[-1]
-        unique_filename = f"{uuid.uuid4()}_{name.replace(' ', '_')}_resume.{file_extension}"
-        file_path = f"uploads/{unique_filename}"
-        
-        # Create uploads directory if it doesn't exist
-        os.makedirs("uploads", exist_ok=True)
-        
-        # Save uploaded resume
-        async with aiofiles.open(file_path, 'wb') as f:
-            content = await resume.read()
-            await f.write(content)
-        
         # Create application object
         application = JobApplication(
             name=name,
@@ -383,67 +238,88 @@ async def submit_job_application(
             coverLetter=coverLetter
         )
         
-        # Send email to HR appearing to come from applicant
-        hr_email_body = generate_hr_job_email(application, resume.filename)
-        hr_email_sent = send_email(
-            HR_EMAIL, 
-            f"Job Application - {position}",
-            hr_email_body,
-            file_path,
-            reply_to=email,  # HR can reply directly to applicant
-            from_name=name  # Just the applicant's name
-        )
-        
-        # Send confirmation email to candidate
-        candidate_email_body = generate_candidate_confirmation_email(name, position)
-        candidate_email_sent = send_email(
-            email,
-            "Application Received - Talvyn Technologies",
-            candidate_email_body,
-            None,  # No attachment for confirmation email
-            reply_to=HR_EMAIL,
-            from_name="Talvyn Technologies HR"
-        )
-        
-        # Clean up uploaded file after sending
-        if os.path.exists(file_path):
-            os.remove(file_path)
+        async def save_resume():
+            # Stream the resume into the content-addressed store, enforcing the size limit as it arrives;
+            # a resume identical to one already stored is kept only once
+            try:
+                with stage_timer("resume_write"):
+                    file_path, resume_size, resume_sha256 = await resume_store.store(resume)
+            except UploadTooLarge as e:
+                raise HTTPException(status_code=413, detail=f"Resume must be at most {e.limit / (1024 * 1024):g} MB")
+            logger.info("Stored resume %s (%d bytes, sha256 %s)", resume.filename, resume_size, resume_sha256)
+            return file_path, resume_size, resume_sha256
         
-        # Handle different email sending scenarios
-        if hr_email_sent and candidate_email_sent:
+        async def accept(file_path: str, resume_size: int, resume_sha256: str):
+            # Queue email to HR appearing to come from applicant, plus the
+            # candidate confirmation; the outbox workers deliver them with retries
+            hr_subject = f"Job Application - {position}"
+            candidate_subject = "Application Received - Talvyn Technologies"
+            file_extension = resume.filename.split('.')[-1]
+            attachment_name = f"{name.replace(' ', '_')}_resume.{file_extension}"
+            # Large resumes stay in the store and HR gets a signed download link instead
+            resume_link = resume_links.make_link(resume_sha256, attachment_name) if resume_links.use_link(resume_size) else None
+            with stage_timer("render"):
+                hr_email_body, hr_email_text = generate_hr_job_email(application, resume.filename, hr_subject, resume_link, resume_size)
+                candidate_email_body, candidate_email_text = generate_candidate_confirmation_email(name, position, candidate_subject)
+            try:
+                await outbox.enqueue(
+                    {
+                        "to_email": HR_EMAIL,
+                        "subject": hr_subject,
+                        "body": hr_email_body,
+                        "text_body": hr_email_text,
+                        # The HR email takes over the store reference when it carries the resume
+                        "attachment_path": None if resume_link else file_path,
+                        "attachment_name": attachment_name,
+                        "reply_to": email,  # HR can reply directly to applicant
+                        "from_name": name  # Just the applicant's name
+                    },
+                    {
+                        "to_email": email,
+                        "subject": candidate_subject,
+                        "body": candidate_email_body,
+                        "text_body": candidate_email_text,
+                        "reply_to": HR_EMAIL,
+                        "from_name": "Talvyn Technologies HR"
+                    }
+                )
+            except Exception:
+                await resume_store.release(resume_sha256)
+                raise
+            if resume_link:
+                # Nothing queued holds the resume; keep it until the link expires
+                await resume_store.release(resume_sha256, keep_until=resume_link[1])
+            
+            # Keep a searchable copy; the emails are already queued, so a failure here is only logged
+            try:
+                await application_store.add_application(application.model_dump(), file_path, resume.filename, resume_sha256)
+            except sqlite3.Error as e:
+                logger.error(f"Could not store job application from {email}: {str(e)}")
+            
             return JSONResponse(
-                status_code=200,
+                status_code=202,
                 content={
                     "success": True,
                     "message": "Application submitted successfully! You will receive a confirmation email shortly."
                 }
             )
-        elif hr_email_sent and not candidate_email_sent:
-            return JSONResponse(
-                status_code=200,
-                content={
-                    "success": True,
-                    "message": "Application submitted successfully! Our team has received your application and will contact you soon."
-                }
-            )
-        elif not hr_email_sent and candidate_email_sent:
-            logger.error(f"Failed to send HR email for job application from {email}")
-            return JSONResponse(
-                status_code=500,
-                content={
-                    "success": False,
-                    "message": "There was an issue processing your application. Please try again or contact us directly."
-                }
-            )
-        else:
-            logger.error(f"Failed to send both HR and candidate emails for job application from {email}")
-            return JSONResponse(
-                status_code=500,
-                content={
-                    "success": False,
-                    "message": "There was an issue processing your application. Please try again or contact us directly at hr@talvyntechnologies.com."
-                }
-            )
+        
+        # A retry carrying the same Idempotency-Key is answered before the resume is even read
+        key = header_key("job-application", idempotency_key)
+        if key:
+            async def save_and_accept():
+                return await accept(*await save_resume())
+            response, _ = await idempotency_cache.run(key, save_and_accept)
+            return response
+        
+        # Otherwise duplicates are recognised by their fields plus the resume contents
+        file_path, resume_size, resume_sha256 = await save_resume()
+        key = payload_key("job-application", application.model_dump(), resume_sha256)
+        response, replayed = await idempotency_cache.run(key, lambda: accept(file_path, resume_size, resume_sha256))
+        if replayed:
+            logger.info("Duplicate job application from %s, replaying the first response", email)
+            await resume_store.release(resume_sha256)
+        return response
             
     except HTTPException:
         raise
@@ -459,37 +335,54 @@ async def submit_job_application(
 
 
 @app.post("/api/contact")
-async def submit_contact_form(contact: ContactForm):
+async def submit_contact_form(
+    contact: ContactForm,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    request: Request = None
+):
     """Handle contact form submission"""
+    parse_elapsed(request)
     try:
-        # Send email to HR appearing to come from customer
-        hr_email_body = generate_hr_contact_email(contact)
-        hr_email_sent = send_email(
-            HR_EMAIL,
-            f"Contact Inquiry - {contact.serviceInterest}",
-            hr_email_body,
-            None,  # No attachment for contact form
-            reply_to=contact.email,  # HR can reply directly to customer
-            from_name=contact.name  # Just the customer's name
-        )
-        
-        if hr_email_sent:
+        async def accept():
+            # In digest mode the inquiry waits for the next combined HR email
+            if contact_digest.enabled:
+                await contact_digest.add({
+                    **contact.model_dump(),
+                    "submitted_at": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                })
+            else:
+                # Queue email to HR appearing to come from customer
+                hr_subject = f"Contact Inquiry - {contact.serviceInterest}"
+                with stage_timer("render"):
+                    hr_email_body, hr_email_text = generate_hr_contact_email(contact, hr_subject)
+                await outbox.enqueue({
+                    "to_email": HR_EMAIL,
+                    "subject": hr_subject,
+                    "body": hr_email_body,
+                    "text_body": hr_email_text,
+                    "reply_to": contact.email,  # HR can reply directly to customer
+                    "from_name": contact.name  # Just the customer's name
+                })
+            
+            try:
+                await application_store.add_contact(contact.model_dump())
+            except sqlite3.Error as e:
+                logger.error(f"Could not store contact inquiry from {contact.email}: {str(e)}")
+            
             return JSONResponse(
-                status_code=200,
+                status_code=202,
                 content={
                     "success": True,
                     "message": "Your message has been sent successfully! We'll get back to you within 24 hours."
                 }
             )
-        else:
-            logger.error(f"Failed to send contact form email from {contact.email}")
-            return JSONResponse(
-                status_code=500,
-                content={
-                    "success": False,
-                    "message": "There was an issue sending your message. Please try again or contact us directly at hr@talvyntechnologies.com."
-                }
-            )
+        
+        # Duplicate submissions (double clicks, retries) replay the first response
+        key = header_key("contact", idempotency_key) or payload_key("contact", contact.model_dump())
+        response, replayed = await idempotency_cache.run(key, accept)
+        if replayed:
+            logger.info("Duplicate contact form from %s, replaying the first response", contact.email)
+        return response
             
     except Exception as e:
         logger.error(f"Unexpected error processing contact form from {contact.email if 'contact' in locals() else 'unknown'}: {str(e)}")
@@ -501,12 +394,235 @@ async def submit_contact_form(contact: ContactForm):
             }
         )
 
+@app.post("/api/job-applications/bulk", dependencies=[Depends(require_partner)])
+async def bulk_job_applications(
+    rows: UploadFile = File(...),
+    resumes: Optional[UploadFile] = File(None),
+    source: str = Form("partner import"),
+    notify_candidates: bool = Form(False)
+):
+    """Import many job applications from a CSV or NDJSON file, optionally with a zip of resumes
+
+    Columns / keys are the JobApplication fields plus an optional "resume"
+    naming a file in the zip. Rows are validated and processed as the file
+    is read, a few at a time, and the response streams one NDJSON result
+    per row followed by a summary line. HR gets one summary email for the
+    whole import; candidates get confirmations only with notify_candidates.
+    """
+    fmt = detect_format(rows.filename, rows.content_type)
+    if fmt is None:
+        raise HTTPException(status_code=400, detail="Rows must be a .csv or .ndjson file")
+    archive = None
+    if resumes is not None and resumes.filename:
+        try:
+            archive = await asyncio.to_thread(zipfile.ZipFile, resumes.file)
+        except zipfile.BadZipFile:
+            raise HTTPException(status_code=400, detail="Resumes must be a zip file")
+    
+    allowed_extensions = ("pdf", "doc", "docx")
+    candidates = []
+    
+    async def import_row(number: int, fields):
+        if isinstance(fields, str):
+            return {"row": number, "status": "invalid", "errors": [fields]}
+        resume_name = fields.pop("resume", None)
+        try:
+            application = JobApplication(**fields)
+        except ValidationError as e:
+            errors = [f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors()]
+            return {"row": number, "status": "invalid", "errors": errors}
+        
+        resume_path = resume_size = resume_sha256 = None
+        if resume_name:
+            if archive is None:
+                return {"row": number, "status": "invalid", "errors": ["resume: no resumes zip was uploaded"]}
+            if resume_name.rsplit(".", 1)[-1].lower() not in allowed_extensions:
+                return {"row": number, "status": "invalid", "errors": ["resume: only PDF and DOC/DOCX files are allowed"]}
+            try:
+                member = ZipMember(archive, archive.getinfo(resume_name))
+            except KeyError:
+                return {"row": number, "status": "invalid", "errors": [f"resume: {resume_name} is not in the zip"]}
+            try:
+                with stage_timer("resume_write"):
+                    resume_path, resume_size, resume_sha256 = await resume_store.store(member)
+            except UploadTooLarge as e:
+                return {"row": number, "status": "invalid", "errors": [f"resume: must be at most {e.limit / (1024 * 1024):g} MB"]}
+            finally:
+                await member.close()
+        
+        async def accept():
+            application_id = await application_store.add_application(
+                application.model_dump(), resume_path, resume_name and os.path.basename(resume_name), resume_sha256
+            )
+            if notify_candidates:
+                candidate_subject = "Application Received - Talvyn Technologies"
+                with stage_timer("render"):
+                    candidate_email_body, candidate_email_text = generate_candidate_confirmation_email(application.name, application.position, candidate_subject)
+                await outbox.enqueue({
+                    "to_email": application.email,
+                    "subject": candidate_subject,
+                    "body": candidate_email_body,
+                    "text_body": candidate_email_text,
+                    "reply_to": HR_EMAIL,
+                    "from_name": "Talvyn Technologies HR"
+                })
+            return JSONResponse(status_code=202, content={"success": True, "id": application_id})
+        
+        # The same candidate already submitted (through the form or an earlier import) is reported, not stored twice
+        key = payload_key("job-application", application.model_dump(), resume_sha256)
+        resume_link = None
+        try:
+            response, replayed = await idempotency_cache.run(key, accept)
+            # HR gets the resume as a link in the summary (when links are configured)
+            if resume_sha256 and not replayed and resume_links.RESUME_LINK_SECRET:
+                resume_link = resume_links.make_link(resume_sha256, os.path.basename(resume_name))
+        finally:
+            # Nothing queued holds on to the resume; the store keeps it for the retention
+            # window, or until the summary's link expires
+            if resume_sha256:
+                await resume_store.release(resume_sha256, keep_until=resume_link and resume_link[1])
+        if replayed:
+            return {"row": number, "status": "duplicate"}
+        candidates.append({
+            **application.model_dump(),
+            "resume_filename": resume_name or "none",
+            "resume_link": resume_link,
+            "resume_size": resume_size
+        })
+        return {"row": number, "status": "accepted", "id": json.loads(response.body)["id"]}
+    
+    async def results():
+        counts = {}
+        try:
+            async for result in run_import(iter_rows(rows.file, fmt), import_row):
+                counts[result["status"]] = counts.get(result["status"], 0) + 1
+                yield json.dumps(result) + "\n"
+            if candidates:
+                hr_subject = f"Bulk Import - {len(candidates)} candidates from {source}"
+                with stage_timer("render"):
+                    hr_email_body, hr_email_text = generate_hr_bulk_import_email(
+                        candidates, source, sum(counts.values()) - len(candidates), hr_subject
+                    )
+                await outbox.enqueue({
+                    "to_email": HR_EMAIL,
+                    "subject": hr_subject,
+                    "body": hr_email_body,
+                    "text_body": hr_email_text,
+                    "from_name": "Talvyn Technologies Bulk Import"
+                })
+            logger.info("Bulk import from %s: %s", source, counts)
+            yield json.dumps({"summary": counts}) + "\n"
+        finally:
+            if archive is not None:
+                archive.close()
+    
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+
+@app.get("/api/applications", dependencies=[Depends(require_admin)])
+async def list_job_applications(
+    q: Optional[str] = None,
+    position: Optional[str] = None,
+    email: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    cursor: Optional[int] = None,
+    limit: int = Query(20, ge=1, le=100)
+):
+    """Search stored job applications, newest first
+
+    q matches position, skills, cover letter and resume text. Pass the
+    returned next_cursor as cursor to get the following page.
+    """
+    items, next_cursor = await application_store.search(
+        "job_applications", q, {"position": position, "email": email}, since, until, cursor, limit
+    )
+    return {"success": True, "items": items, "next_cursor": next_cursor}
+
+
+@app.get("/api/contacts", dependencies=[Depends(require_admin)])
+async def list_contact_inquiries(
+    q: Optional[str] = None,
+    serviceInterest: Optional[str] = None,
+    email: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    cursor: Optional[int] = None,
+    limit: int = Query(20, ge=1, le=100)
+):
+    """Search stored contact inquiries, newest first (q matches company, service and message)"""
+    items, next_cursor = await application_store.search(
+        "contact_inquiries", q, {"serviceInterest": serviceInterest, "email": email}, since, until, cursor, limit
+    )
+    return {"success": True, "items": items, "next_cursor": next_cursor}
+
+
+@app.post("/api/outbox/requeue-dead", dependencies=[Depends(require_admin)])
+async def requeue_dead_emails():
+    """Put every dead-lettered email back in the queue for another round of attempts"""
+    count = await asyncio.to_thread(outbox_db.requeue_dead)
+    outbox.notify()
+    logger.info("Requeued %d dead-lettered emails", count)
+    return {"success": True, "message": f"Requeued {count} emails", "requeued": count}
+
+
+@app.get("/api/resumes/{sha256}")
+async def download_resume(sha256: str, request: Request, name: str = Query(...), expires: int = Query(...), sig: str = Query(...)):
+    """Serve a resume through the signed link in an HR email, with Range and ETag support"""
+    if not resume_links.verify(sha256, name, expires, sig):
+        raise HTTPException(status_code=403, detail="This download link is invalid or has expired")
+    path = blob_path(sha256)
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        raise HTTPException(status_code=404, detail="This resume is no longer available")
+    # Resumes are stored under their content hash, which makes it a strong ETag
+    return file_response(
+        request, path, size, f'"{sha256}"',
+        mimetypes.guess_type(name)[0] or "application/octet-stream",
+        headers={
+            "Content-Disposition": content_disposition(name),
+            "Cache-Control": f"private, max-age={max(expires - int(time.time()), 0)}",
+        }
+    )
+
+
 @app.get("/api/health")
 async def health_check():
     """Health check endpoint"""
     return {"status": "healthy", "timestamp": datetime.now().isoformat()}
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """Prometheus metrics, summed over all worker processes"""
+    outbox_counts = await asyncio.to_thread(outbox_db.stats)
+    gauges = {
+        "outbox_messages": (
+            "Messages in the outbox by status",
+            {(("status", status),): count for status, count in outbox_counts.items()}
+        ),
+        # As seen by the worker answering this scrape
+        "smtp_transport_health": (
+            "Health score (0-1) of each SMTP transport",
+            {(("transport", name),): health for name, health, _ in mail_transports.status()}
+        ),
+        "smtp_transport_circuit_open": (
+            "1 while an SMTP transport is skipped after repeated failures",
+            {(("transport", name),): int(is_open) for name, _, is_open in mail_transports.status()}
+        ),
+    }
+    return PlainTextResponse(
+        await asyncio.to_thread(metrics.render, gauges),
+        media_type="text/plain; version=0.0.4"
+    )
+
+
+# The built frontend (FRONTEND_DIST_DIR); mounted after every API route so those take precedence
+if static_site.enabled:
+    app.mount("/", static_site)
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # log_config=None keeps uvicorn from replacing the logging set up by configure_logging()
+    uvicorn.run(app, host="0.0.0.0", port=8000, log_config=None)
\ No newline at end of file
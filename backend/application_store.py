@@ -0,0 +1,311 @@
+import asyncio
+import multiprocessing
+import os
+import re
+import sqlite3
+import threading
+import time
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+from resume_text import extract_text
+
+logger = logging.getLogger(__name__)
+
+# Application store configuration
+DATA_DIR = os.getenv("DATA_DIR", "data")
+APPLICATIONS_DB = os.getenv("APPLICATIONS_DB", os.path.join(DATA_DIR, "applications.db"))
+# Processes extracting resume text for the search index, away from the event loop and the GIL
+RESUME_EXTRACT_WORKERS = int(os.getenv("RESUME_EXTRACT_WORKERS", "2"))
+
+QUERY_MAX_LIMIT = 100
+
+# Columns are named after the JobApplication / ContactForm fields so rows map straight back to them.
+# The FTS tables are external-content indexes kept in sync by triggers.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS job_applications (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    email TEXT NOT NULL,
+    phone TEXT NOT NULL,
+    position TEXT NOT NULL,
+    experience TEXT NOT NULL,
+    currentCompany TEXT NOT NULL,
+    expectedSalary TEXT NOT NULL,
+    noticePeriod TEXT NOT NULL,
+    skills TEXT NOT NULL,
+    coverLetter TEXT NOT NULL,
+    resume_filename TEXT,
+    resume_sha256 TEXT,
+    resume_path TEXT,
+    resume_text TEXT,
+    resume_status TEXT NOT NULL DEFAULT 'pending',
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS job_applications_position ON job_applications (position COLLATE NOCASE, id);
+CREATE INDEX IF NOT EXISTS job_applications_email ON job_applications (email COLLATE NOCASE, id);
+CREATE INDEX IF NOT EXISTS job_applications_resume_status ON job_applications (resume_status);
+CREATE VIRTUAL TABLE IF NOT EXISTS job_applications_fts USING fts5(
+    position, skills, coverLetter, resume_text,
+    content='job_applications', content_rowid='id', tokenize='porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS job_applications_ai AFTER INSERT ON job_applications BEGIN
+    INSERT INTO job_applications_fts (rowid, position, skills, coverLetter, resume_text)
+    VALUES (new.id, new.position, new.skills, new.coverLetter, new.resume_text);
+END;
+CREATE TRIGGER IF NOT EXISTS job_applications_au AFTER UPDATE ON job_applications BEGIN
+    INSERT INTO job_applications_fts (job_applications_fts, rowid, position, skills, coverLetter, resume_text)
+    VALUES ('delete', old.id, old.position, old.skills, old.coverLetter, old.resume_text);
+    INSERT INTO job_applications_fts (rowid, position, skills, coverLetter, resume_text)
+    VALUES (new.id, new.position, new.skills, new.coverLetter, new.resume_text);
+END;
+CREATE TRIGGER IF NOT EXISTS job_applications_ad AFTER DELETE ON job_applications BEGIN
+    INSERT INTO job_applications_fts (job_applications_fts, rowid, position, skills, coverLetter, resume_text)
+    VALUES ('delete', old.id, old.position, old.skills, old.coverLetter, old.resume_text);
+END;
+
+CREATE TABLE IF NOT EXISTS contact_inquiries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    email TEXT NOT NULL,
+    phone TEXT NOT NULL,
+    company TEXT NOT NULL,
+    serviceInterest TEXT NOT NULL,
+    message TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS contact_inquiries_service ON contact_inquiries (serviceInterest COLLATE NOCASE, id);
+CREATE INDEX IF NOT EXISTS contact_inquiries_email ON contact_inquiries (email COLLATE NOCASE, id);
+CREATE VIRTUAL TABLE IF NOT EXISTS contact_inquiries_fts USING fts5(
+    company, serviceInterest, message,
+    content='contact_inquiries', content_rowid='id', tokenize='porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS contact_inquiries_ai AFTER INSERT ON contact_inquiries BEGIN
+    INSERT INTO contact_inquiries_fts (rowid, company, serviceInterest, message)
+    VALUES (new.id, new.company, new.serviceInterest, new.message);
+END;
+CREATE TRIGGER IF NOT EXISTS contact_inquiries_ad AFTER DELETE ON contact_inquiries BEGIN
+    INSERT INTO contact_inquiries_fts (contact_inquiries_fts, rowid, company, serviceInterest, message)
+    VALUES ('delete', old.id, old.company, old.serviceInterest, old.message);
+END;
+"""
+
+# Exact-match filters each table accepts, compared case-insensitively
+FILTERS = {
+    "job_applications": ("position", "email"),
+    "contact_inquiries": ("serviceInterest", "email"),
+}
+# Columns returned by queries; the resume text and path stay internal
+RESULT_COLUMNS = {
+    "job_applications": ("id", "name", "email", "phone", "position", "experience", "currentCompany",
+                         "expectedSalary", "noticePeriod", "skills", "coverLetter", "resume_filename",
+                         "resume_status", "created_at"),
+    "contact_inquiries": ("id", "name", "email", "phone", "company", "serviceInterest", "message", "created_at"),
+}
+
+_local = threading.local()
+
+
+def _connect():
+    """Return this thread's connection to the application database"""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        os.makedirs(os.path.dirname(APPLICATIONS_DB) or ".", exist_ok=True)
+        conn = sqlite3.connect(APPLICATIONS_DB, timeout=10, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+        _local.conn = conn
+    return conn
+
+
+def _insert(table: str, fields: dict):
+    columns = ", ".join(fields)
+    placeholders = ", ".join("?" for _ in fields)
+    return _connect().execute(
+        f"INSERT INTO {table} ({columns}, created_at) VALUES ({placeholders}, ?)",
+        (*fields.values(), time.time())
+    ).lastrowid
+
+
+def _set_resume_text(application_id: int, text: str, status: str):
+    _connect().execute(
+        "UPDATE job_applications SET resume_text = ?, resume_status = ? WHERE id = ?",
+        (text, status, application_id)
+    )
+
+
+def _pending_resumes():
+    return _connect().execute(
+        "SELECT id, resume_path, resume_filename, resume_sha256 FROM job_applications WHERE resume_status = 'pending'"
+    ).fetchall()
+
+
+def _known_resume_text(sha256: str):
+    """(text, status) already extracted from an identical resume, or None"""
+    row = _connect().execute(
+        "SELECT resume_text, resume_status FROM job_applications "
+        "WHERE resume_sha256 = ? AND resume_status IN ('done', 'failed') LIMIT 1",
+        (sha256,)
+    ).fetchone()
+    return (row[0], row[1]) if row else None
+
+
+def match_expression(q: str):
+    """Turn free text into an FTS5 query: every word must match, as a prefix"""
+    terms = re.findall(r"\w+", q)
+    return " ".join(f'"{term}"*' for term in terms) or None
+
+
+def _search(table: str, q: str = None, filters: dict = None, since: float = None, until: float = None,
+            cursor: int = None, limit: int = 20):
+    """One page of rows, newest first, and the cursor for the next page (keyset on id)"""
+    columns = ", ".join(f"t.{column}" for column in RESULT_COLUMNS[table])
+    where, params = [], []
+    key = "t.id"
+    match = match_expression(q) if q else None
+    if match:
+        # Driving the query from the FTS index keeps rowid order, so the id keyset still applies
+        source = f"{table}_fts JOIN {table} t ON t.id = {table}_fts.rowid"
+        columns += f", snippet({table}_fts, -1, '[', ']', '...', 12) AS snippet"
+        where.append(f"{table}_fts MATCH ?")
+        params.append(match)
+        key = f"{table}_fts.rowid"
+    else:
+        source = f"{table} t"
+    for column in FILTERS[table]:
+        value = (filters or {}).get(column)
+        if value:
+            where.append(f"t.{column} = ? COLLATE NOCASE")
+            params.append(value)
+    if since is not None:
+        where.append("t.created_at >= ?")
+        params.append(since)
+    if until is not None:
+        where.append("t.created_at < ?")
+        params.append(until)
+    if cursor is not None:
+        where.append(f"{key} < ?")
+        params.append(cursor)
+    sql = f"SELECT {columns} FROM {source}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += f" ORDER BY {key} DESC LIMIT ?"
+    params.append(limit)
+
+    rows = _connect().execute(sql, params).fetchall()
+    items = []
+    for row in rows:
+        item = dict(row)
+        item["created_at"] = datetime.fromtimestamp(item["created_at"]).isoformat()
+        items.append(item)
+    next_cursor = rows[-1]["id"] if len(rows) == limit else None
+    return items, next_cursor
+
+
+class ApplicationStore:
+    """Keeps every submission in SQLite and indexes resume text in worker processes"""
+
+    def __init__(self, extract_workers: int = RESUME_EXTRACT_WORKERS):
+        self.extract_workers = extract_workers
+        self._pool = None
+        self._tasks = set()
+        self._extracting = {}  # resume sha256 -> extraction shared by applications with that resume
+
+    async def start(self):
+        await asyncio.to_thread(_connect)
+        self._pool = self._new_pool()
+        # Pick up resumes whose extraction was cut short by a restart
+        for row in await asyncio.to_thread(_pending_resumes):
+            self._index_resume(row["id"], row["resume_path"], row["resume_filename"], row["resume_sha256"])
+
+    def _new_pool(self):
+        # spawn, not fork: the parent has SQLite connections and threads that must not be copied
+        return ProcessPoolExecutor(self.extract_workers, mp_context=multiprocessing.get_context("spawn"))
+
+    async def stop(self):
+        tasks = list(self._tasks) + list(self._extracting.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    async def add_application(self, fields: dict, resume_path: str, resume_filename: str, resume_sha256: str):
+        """Record a job application (JobApplication fields) and queue its resume, if any, for indexing"""
+        application_id = await asyncio.to_thread(_insert, "job_applications", {
+            **fields,
+            "resume_filename": resume_filename,
+            "resume_sha256": resume_sha256,
+            "resume_path": resume_path,
+            "resume_status": "pending" if resume_path else "none",
+        })
+        if resume_path:
+            self._index_resume(application_id, resume_path, resume_filename, resume_sha256)
+        return application_id
+
+    async def add_contact(self, fields: dict):
+        """Record a contact inquiry (ContactForm fields)"""
+        return await asyncio.to_thread(_insert, "contact_inquiries", fields)
+
+    def _index_resume(self, application_id: int, path: str, filename: str, sha256: str):
+        if self._pool is None:
+            return
+        task = asyncio.create_task(self._index(application_id, path, filename, sha256))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _index(self, application_id: int, path: str, filename: str, sha256: str):
+        # The same resume sent with several applications is only extracted once
+        extraction = self._extracting.get(sha256)
+        if extraction is None:
+            extraction = asyncio.create_task(self._extract(application_id, path, filename, sha256))
+            self._extracting[sha256] = extraction
+            extraction.add_done_callback(lambda _: self._extracting.pop(sha256, None))
+        result = await asyncio.shield(extraction)
+        if result is None:
+            return
+        try:
+            await asyncio.to_thread(_set_resume_text, application_id, *result)
+        except sqlite3.Error as e:
+            logger.error(f"Could not store resume text of application {application_id}: {str(e)}")
+
+    async def _extract(self, application_id: int, path: str, filename: str, sha256: str):
+        """(text, status) for a resume, or None if it should stay pending"""
+        known = await asyncio.to_thread(_known_resume_text, sha256)
+        if known is not None:
+            return known
+        loop = asyncio.get_running_loop()
+        pool = self._pool
+        try:
+            text = await loop.run_in_executor(pool, extract_text, path, filename)
+            return text, "done"
+        except BrokenProcessPool:
+            # A worker died (e.g. a pathological file ran it out of memory); leave the row
+            # pending for the next start and replace the pool for everyone else
+            logger.error(f"Resume extraction worker crashed on application {application_id}")
+            if self._pool is pool:
+                pool.shutdown(wait=False)
+                self._pool = self._new_pool()
+            return None
+        except Exception as e:
+            logger.warning(f"Could not extract text from resume of application {application_id}: {type(e).__name__}: {str(e)}")
+            return None, "failed"
+
+    async def search(self, table: str, q: str = None, filters: dict = None, since: datetime = None,
+                     until: datetime = None, cursor: int = None, limit: int = 20):
+        """Page of job_applications or contact_inquiries rows, see _search"""
+        limit = max(1, min(limit, QUERY_MAX_LIMIT))
+        return await asyncio.to_thread(
+            _search, table, q, filters,
+            since.timestamp() if since else None,
+            until.timestamp() if until else None,
+            cursor, limit
+        )
+
+
+application_store = ApplicationStore()
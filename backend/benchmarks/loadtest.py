@@ -0,0 +1,306 @@
+"""Load test for the submission endpoints against a local SMTP sink
+
+Starts the FastAPI app under uvicorn in a subprocess, pointed at an
+in-process SMTP sink, then drives /api/contact and /api/job-application
+with concurrent clients. Reports request throughput and latency
+percentiles, /api/health latency while under load (event-loop lag), peak
+RSS of the server and how long the outbox takes to deliver every email.
+
+    python benchmarks/loadtest.py --scenario mixed
+    python benchmarks/loadtest.py --scenario mixed --save-baseline
+    python benchmarks/loadtest.py --scenario flaky-smtp --requests 100
+
+Results are compared with benchmarks/baselines/<scenario>.json when it
+exists, and the run exits with status 1 if any figure regressed by more
+than --tolerance. Baselines are machine specific; record them on the
+hardware you compare on.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from smtp_sink import SMTPSink
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+
+SCENARIOS = {
+    "contact": {"requests": 500, "concurrency": 50, "contact_ratio": 1.0, "resume_kb": [200]},
+    "mixed": {"requests": 300, "concurrency": 30, "contact_ratio": 0.5, "resume_kb": [120, 450, 2048]},
+    "large-resumes": {"requests": 60, "concurrency": 20, "contact_ratio": 0.0, "resume_kb": [5120, 9216]},
+    "flaky-smtp": {"requests": 200, "concurrency": 20, "contact_ratio": 0.5, "resume_kb": [300],
+                   "sink_latency": 0.05, "sink_failure_rate": 0.1},
+}
+
+# Figures compared against the baseline, and whether a larger value is better
+COMPARED = {
+    "throughput_rps": True,
+    "latency_p50_ms": False,
+    "latency_p95_ms": False,
+    "latency_p99_ms": False,
+    "health_p99_ms": False,
+    "peak_rss_mb": False,
+    "mail_drain_seconds": False,
+}
+
+
+def percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def process_tree(pid: int):
+    """pid and all of its descendants (Linux /proc)"""
+    pids = [pid]
+    for current in pids:
+        try:
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children") as f:
+                    pids.extend(int(child) for child in f.read().split())
+        except OSError:
+            continue
+    return pids
+
+
+def peak_rss_mb(pid: int) -> float:
+    """Sum of peak resident set sizes (VmHWM) of the server processes"""
+    total_kb = 0
+    for current in process_tree(pid):
+        try:
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        total_kb += int(line.split()[1])
+        except OSError:
+            continue
+    return total_kb / 1024
+
+
+def fake_resume(seed: int, filler: bytes) -> bytes:
+    """A resume the size of filler whose content is unique to seed, so the resume store cannot dedupe it"""
+    header = b"%PDF-1.4\n% benchmark resume " + str(seed).encode() + b"\n"
+    return header + filler[len(header):]
+
+
+def start_server(port: int, smtp_port: int, workdir: str, workers: int):
+    env = dict(
+        os.environ,
+        SMTP_SERVER="127.0.0.1",
+        SMTP_PORT=str(smtp_port),
+        SMTP_SECURITY="none",
+        SMTP_USERNAME="bench@localhost",
+        SMTP_PASSWORD="bench",
+        HR_EMAIL="hr@localhost",
+        DATA_DIR=os.path.join(workdir, "data"),
+        UPLOAD_DIR=os.path.join(workdir, "uploads"),
+        # Measure the mail path, not the ingress limits
+        RATE_LIMITS="",
+        MAX_INFLIGHT_SUBMISSIONS="0",
+        MAIL_RATE="0",
+        OUTBOX_RETRY_BASE="0.5",
+        OUTBOX_POLL_INTERVAL="0.5",
+    )
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+    )
+
+
+async def wait_until_healthy(client: httpx.AsyncClient, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/api/health")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("Server did not become healthy")
+
+
+async def probe_health(client: httpx.AsyncClient, samples: list, stop: asyncio.Event):
+    """Poll /api/health while the load runs; its latency is the server's event-loop lag"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            await client.get("/api/health")
+            samples.append(time.perf_counter() - start)
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.05)
+
+
+async def run_load(client: httpx.AsyncClient, config: dict):
+    # Random bytes are generated once per size; each request only gets its own header
+    fillers = [os.urandom(kb * 1024) for kb in config["resume_kb"]]
+    semaphore = asyncio.Semaphore(config["concurrency"])
+    results = []
+
+    async def one(n: int):
+        # Spread the contacts evenly through the run, so any prefix of it has the configured mix
+        ratio = config["contact_ratio"]
+        is_contact = math.floor((n + 1) * ratio) > math.floor(n * ratio)
+        async with semaphore:
+            resume = None if is_contact else fake_resume(n, fillers[n % len(fillers)])
+            start = time.perf_counter()
+            if is_contact:
+                response = await client.post("/api/contact", json={
+                    "name": f"Bench Client {n}",
+                    "email": f"client{n}@example.com",
+                    "phone": "555-0100",
+                    "company": "Benchmark Inc",
+                    "serviceInterest": "Cloud",
+                    "message": f"Load test inquiry number {n}",
+                })
+            else:
+                response = await client.post("/api/job-application", data={
+                    "name": f"Bench Candidate {n}",
+                    "email": f"candidate{n}@example.com",
+                    "phone": "555-0101",
+                    "position": "Software Engineer",
+                    "experience": "5 years",
+                    "currentCompany": "Benchmark Inc",
+                    "expectedSalary": "100k",
+                    "noticePeriod": "30 days",
+                    "skills": "python, fastapi",
+                    "coverLetter": f"Load test application number {n}",
+                }, files={"resume": (f"resume{n}.pdf", resume, "application/pdf")})
+            results.append(("contact" if is_contact else "job", response.status_code, time.perf_counter() - start))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(n) for n in range(config["requests"])))
+    return results, time.perf_counter() - started
+
+
+async def benchmark(config: dict):
+    sink = SMTPSink(latency=config.get("sink_latency", 0.0), failure_rate=config.get("sink_failure_rate", 0.0)).start()
+    port = free_port()
+    with tempfile.TemporaryDirectory(prefix="talvyn-bench-") as workdir:
+        server = start_server(port, sink.port, workdir, config["workers"])
+        try:
+            limits = httpx.Limits(max_connections=config["concurrency"] + 5)
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=120, limits=limits) as client:
+                await wait_until_healthy(client)
+                health, stop = [], asyncio.Event()
+                prober = asyncio.create_task(probe_health(client, health, stop))
+                load_started = time.time()
+                results, elapsed = await run_load(client, config)
+                stop.set()
+                await prober
+
+                accepted = [r for r in results if 200 <= r[1] < 300]
+                expected_mail = sum(1 if kind == "contact" else 2 for kind, _, _ in accepted)
+                deadline = time.monotonic() + config["drain_timeout"]
+                while sink.stats.messages < expected_mail and time.monotonic() < deadline:
+                    await asyncio.sleep(0.1)
+                drained = sink.stats.messages >= expected_mail
+                rss = peak_rss_mb(server.pid)
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+            sink.stop()
+
+    latencies = [r[2] for r in results]
+    report = {
+        "requests": len(results),
+        "errors": len(results) - len(accepted),
+        "throughput_rps": len(results) / elapsed,
+        "latency_p50_ms": percentile(latencies, 50) * 1000,
+        "latency_p95_ms": percentile(latencies, 95) * 1000,
+        "latency_p99_ms": percentile(latencies, 99) * 1000,
+        "latency_max_ms": max(latencies, default=0) * 1000,
+        "health_p50_ms": percentile(health, 50) * 1000,
+        "health_p99_ms": percentile(health, 99) * 1000,
+        "peak_rss_mb": rss,
+        "mail_expected": expected_mail,
+        "mail_delivered": sink.stats.messages,
+        "mail_drain_seconds": (sink.stats.last_message_at or load_started) - load_started if drained else None,
+        "smtp": sink.stats.as_dict(),
+    }
+    for kind in ("contact", "job"):
+        kind_latencies = [r[2] for r in results if r[0] == kind]
+        if kind_latencies:
+            report[f"{kind}_p95_ms"] = percentile(kind_latencies, 95) * 1000
+    return report
+
+
+def compare(report: dict, baseline: dict, tolerance: float):
+    """Print the comparison and return the names of regressed figures"""
+    regressions = []
+    print(f"\n{'metric':<22}{'baseline':>12}{'current':>12}{'change':>10}")
+    for name, higher_is_better in COMPARED.items():
+        old, new = baseline.get(name), report.get(name)
+        if not old or new is None:
+            continue
+        change = (new - old) / old
+        worse = -change if higher_is_better else change
+        flag = "  REGRESSION" if worse > tolerance else ""
+        print(f"{name:<22}{old:>12.1f}{new:>12.1f}{change:>+9.0%}{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="mixed")
+    parser.add_argument("--requests", type=int, help="override the scenario's request count")
+    parser.add_argument("--concurrency", type=int, help="override the scenario's concurrent clients")
+    parser.add_argument("--sink-latency", type=float, help="seconds of latency per SMTP step")
+    parser.add_argument("--sink-failure-rate", type=float, help="fraction of messages the sink rejects")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--drain-timeout", type=float, default=120.0, help="seconds to wait for all mail to arrive")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative regression")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the scenario baseline")
+    args = parser.parse_args()
+
+    config = dict(SCENARIOS[args.scenario], workers=args.workers, drain_timeout=args.drain_timeout)
+    for option in ("requests", "concurrency", "sink_latency", "sink_failure_rate"):
+        if getattr(args, option) is not None:
+            config[option] = getattr(args, option)
+
+    report = asyncio.run(benchmark(config))
+    report["scenario"] = args.scenario
+    report["config"] = config
+    print(json.dumps(report, indent=2))
+
+    baseline_path = os.path.join(BASELINE_DIR, f"{args.scenario}.json")
+    if args.save_baseline:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        with open(baseline_path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nBaseline saved to {baseline_path}")
+        return 0
+    if os.path.exists(baseline_path):
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        if baseline.get("config") != config:
+            print("\nNote: baseline was recorded with a different configuration")
+        if compare(report, baseline, args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
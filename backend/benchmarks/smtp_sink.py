@@ -0,0 +1,131 @@
+"""Local SMTP server that accepts and discards mail, for benchmarks
+
+Speaks enough ESMTP for smtplib (EHLO, AUTH, MAIL, RCPT, DATA, RSET, NOOP,
+QUIT) without TLS. Latency and failures can be injected to see how the
+mail path behaves when the provider is slow or flaky.
+"""
+import random
+import socketserver
+import threading
+import time
+
+
+class SinkStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.logins = 0
+        self.messages = 0
+        self.bytes = 0
+        self.failures = 0
+        self.first_message_at = None
+        self.last_message_at = None
+
+    def as_dict(self):
+        with self.lock:
+            return {
+                "connections": self.connections,
+                "logins": self.logins,
+                "messages": self.messages,
+                "bytes": self.bytes,
+                "failures": self.failures,
+            }
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def _reply(self, text: str):
+        self.wfile.write(text.encode("ascii") + b"\r\n")
+
+    def _delay(self):
+        latency = self.server.latency
+        if latency:
+            time.sleep(latency * random.uniform(0.5, 1.5))
+
+    def handle(self):
+        stats = self.server.stats
+        with stats.lock:
+            stats.connections += 1
+        self._delay()
+        self._reply("220 smtp-sink ESMTP ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode("ascii", "replace").strip()
+            verb = command.split(" ", 1)[0].upper()
+            if verb in ("EHLO", "HELO"):
+                self._reply("250-smtp-sink\r\n250-8BITMIME\r\n250 AUTH PLAIN LOGIN")
+            elif verb == "AUTH":
+                self._delay()
+                with stats.lock:
+                    stats.logins += 1
+                self._reply("235 Authentication successful")
+            elif verb == "DATA":
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                size = 0
+                while True:
+                    data = self.rfile.readline()
+                    if not data or data == b".\r\n":
+                        break
+                    size += len(data)
+                self._delay()
+                if random.random() < self.server.failure_rate:
+                    with stats.lock:
+                        stats.failures += 1
+                    self._reply("451 Injected temporary failure")
+                    continue
+                now = time.time()
+                with stats.lock:
+                    stats.messages += 1
+                    stats.bytes += size
+                    stats.first_message_at = stats.first_message_at or now
+                    stats.last_message_at = now
+                self._reply("250 OK queued")
+            elif verb == "QUIT":
+                self._reply("221 Bye")
+                return
+            else:
+                self._reply("250 OK")
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    """Threaded SMTP sink; use port 0 to pick a free port"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, failure_rate: float = 0.0):
+        super().__init__((host, port), _Handler)
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.stats = SinkStats()
+        self._thread = None
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="smtp-sink", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run a local SMTP sink")
+    parser.add_argument("--port", type=int, default=2525)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added per SMTP step")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="fraction of messages rejected with 451")
+    args = parser.parse_args()
+    sink = SMTPSink(port=args.port, latency=args.latency, failure_rate=args.failure_rate)
+    print(f"SMTP sink listening on 127.0.0.1:{sink.port}")
+    try:
+        sink.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,134 @@
+import asyncio
+import csv
+import io
+import itertools
+import json
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Bulk import configuration
+BULK_MAX_ROWS = int(os.getenv("BULK_MAX_ROWS", "5000"))
+# Rows of one import processed at the same time
+BULK_CONCURRENCY = int(os.getenv("BULK_CONCURRENCY", "8"))
+
+# Rows parsed per trip to the worker thread
+_READ_BATCH = 100
+
+
+def detect_format(filename: str, content_type: str):
+    """"csv" or "ndjson" from the upload's name or type, or None if it is neither"""
+    extension = (filename or "").rsplit(".", 1)[-1].lower()
+    if extension == "csv" or content_type in ("text/csv", "application/csv"):
+        return "csv"
+    if extension in ("ndjson", "jsonl") or content_type in ("application/x-ndjson", "application/jsonl"):
+        return "ndjson"
+    return None
+
+
+def iter_rows(fileobj, fmt: str):
+    """Yield (row number, fields dict) from a binary file, or (row number, error message) for unreadable rows
+
+    Reads as it goes, so memory use does not depend on the size of the file.
+    """
+    text = io.TextIOWrapper(fileobj, encoding="utf-8-sig", errors="replace", newline="")
+    if fmt == "csv":
+        reader = csv.DictReader(text)
+        for number, row in enumerate(reader, 1):
+            if None in row:
+                yield number, "Row has more values than the header"
+                continue
+            yield number, {name: (value or "").strip() for name, value in row.items() if name}
+        return
+    number = 0
+    for line in text:
+        if not line.strip():
+            continue
+        number += 1
+        try:
+            fields = json.loads(line)
+        except ValueError as e:
+            yield number, f"Invalid JSON: {str(e)}"
+            continue
+        if not isinstance(fields, dict):
+            yield number, "Each line must be a JSON object"
+            continue
+        yield number, fields
+
+
+class ZipMember:
+    """A file inside an uploaded zip, readable like an UploadFile without extracting it first"""
+
+    def __init__(self, archive, info):
+        self._archive = archive
+        self._info = info
+        self._file = None
+        self.filename = os.path.basename(info.filename)
+        self.size = info.file_size
+
+    async def read(self, size: int = -1) -> bytes:
+        if self._file is None:
+            self._file = await asyncio.to_thread(self._archive.open, self._info)
+        return await asyncio.to_thread(self._file.read, size)
+
+    async def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+async def run_import(rows, process, concurrency: int = BULK_CONCURRENCY, max_rows: int = BULK_MAX_ROWS):
+    """Run process(row number, fields) over rows with bounded concurrency, yielding each result as it finishes
+
+    rows is a (blocking) iterator such as iter_rows(); it is read in a worker
+    thread and only as fast as rows are processed. Results arrive in
+    completion order and always carry their "row" number.
+    """
+    results = asyncio.Queue()
+    semaphore = asyncio.Semaphore(concurrency)
+    done = object()
+
+    async def run(number, fields):
+        try:
+            result = await process(number, fields)
+        except Exception as e:
+            logger.error(f"Bulk import row {number} failed: {type(e).__name__}: {str(e)}")
+            result = {"row": number, "status": "error", "message": "Could not process this row"}
+        finally:
+            semaphore.release()
+        await results.put(result)
+
+    async def produce():
+        tasks = set()
+        count = 0
+        try:
+            while True:
+                batch = await asyncio.to_thread(lambda: list(itertools.islice(rows, _READ_BATCH)))
+                if not batch:
+                    break
+                for number, fields in batch:
+                    if count >= max_rows:
+                        await results.put({"row": number, "status": "error", "message": f"Imports are limited to {max_rows} rows"})
+                        return
+                    count += 1
+                    await semaphore.acquire()
+                    task = asyncio.create_task(run(number, fields))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+        except (csv.Error, OSError) as e:
+            await results.put({"row": None, "status": "error", "message": f"Could not read the file: {str(e)}"})
+        finally:
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await results.put(done)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            result = await results.get()
+            if result is done:
+                break
+            yield result
+    finally:
+        # The client went away or the caller stopped early: stop reading and let running rows finish
+        producer.cancel()
+        await asyncio.gather(producer, return_exceptions=True)
@@ -0,0 +1,150 @@
+import asyncio
+import json
+import logging
+import os
+import time
+
+import outbox as outbox_db
+from outbox import outbox
+from templating import templates
+
+logger = logging.getLogger(__name__)
+
+# Digest configuration
+CONTACT_DIGEST_ENABLED = os.getenv("CONTACT_DIGEST_ENABLED", "false").lower() in ("1", "true", "yes")
+# Seconds the oldest buffered inquiry may wait before a digest is sent
+CONTACT_DIGEST_INTERVAL = float(os.getenv("CONTACT_DIGEST_INTERVAL", "300"))
+# A digest is sent early once this many inquiries are waiting, and never holds more
+CONTACT_DIGEST_MAX_BATCH = int(os.getenv("CONTACT_DIGEST_MAX_BATCH", "50"))
+
+# The buffer lives in the outbox database so taking a batch and queueing its
+# digest email happen in one transaction, and buffered inquiries survive restarts
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS contact_digest (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL
+)
+"""
+
+
+def _init():
+    with outbox_db.transaction() as conn:
+        conn.execute(SCHEMA)
+
+
+def _add(payload: dict):
+    """Buffer one inquiry, returning how many are now waiting"""
+    with outbox_db.transaction() as conn:
+        conn.execute(
+            "INSERT INTO contact_digest (payload, created_at) VALUES (?, ?)",
+            (json.dumps(payload), time.time())
+        )
+        return conn.execute("SELECT COUNT(*) FROM contact_digest").fetchone()[0]
+
+
+def _render(inquiries, hr_email: str):
+    """Build the outbox message for a batch of inquiries"""
+    if len(inquiries) == 1:
+        # A lone inquiry goes out as the regular email so HR can reply directly
+        contact = inquiries[0]
+        subject = f"Contact Inquiry - {contact['serviceInterest']}"
+        body, text_body = templates.render("hr_contact", subject=subject, **contact)
+        return {
+            "to_email": hr_email,
+            "subject": subject,
+            "body": body,
+            "text_body": text_body,
+            "reply_to": contact["email"],
+            "from_name": contact["name"]
+        }
+
+    items = [templates.render("_hr_contact_digest_item", number=n, **contact)
+             for n, contact in enumerate(inquiries, 1)]
+    subject = f"Contact Inquiries Digest - {len(inquiries)} new inquiries"
+    context = {
+        "subject": subject,
+        "count": len(inquiries),
+        "first_at": inquiries[0]["submitted_at"],
+        "last_at": inquiries[-1]["submitted_at"],
+    }
+    body, text_body = templates.render_with("hr_contact_digest", {"inquiries": items}, **context)
+    return {
+        "to_email": hr_email,
+        "subject": subject,
+        "body": body,
+        "text_body": text_body,
+        "from_name": "Talvyn Technologies Contact Form"
+    }
+
+
+def _flush(hr_email: str, force: bool = False):
+    """Move one batch of buffered inquiries into a digest email, if one is due"""
+    now = time.time()
+    with outbox_db.transaction() as conn:
+        count, oldest = conn.execute("SELECT COUNT(*), MIN(created_at) FROM contact_digest").fetchone()
+        if not count:
+            return 0
+        if not force and count < CONTACT_DIGEST_MAX_BATCH and oldest > now - CONTACT_DIGEST_INTERVAL:
+            return 0
+        rows = conn.execute(
+            "DELETE FROM contact_digest WHERE id IN "
+            "(SELECT id FROM contact_digest ORDER BY id LIMIT ?) RETURNING id, payload",
+            (CONTACT_DIGEST_MAX_BATCH,)
+        ).fetchall()
+        inquiries = [json.loads(row["payload"]) for row in sorted(rows, key=lambda row: row["id"])]
+        outbox_db.insert_message(conn, _render(inquiries, hr_email), now)
+    return len(inquiries)
+
+
+class ContactDigest:
+    """Buffers contact inquiries and sends HR one combined email per batch"""
+
+    def __init__(self, hr_email: str, enabled: bool = CONTACT_DIGEST_ENABLED):
+        self.hr_email = hr_email
+        self.enabled = enabled
+        self._task = None
+        self._batch_full = None
+
+    async def add(self, payload: dict):
+        """Buffer an inquiry (ContactForm fields plus submitted_at)"""
+        waiting = await asyncio.to_thread(_add, payload)
+        if waiting >= CONTACT_DIGEST_MAX_BATCH and self._batch_full is not None:
+            self._batch_full.set()
+
+    async def start(self):
+        await asyncio.to_thread(_init)
+        if not self.enabled:
+            # Send anything still buffered from when digest mode was on
+            while await asyncio.to_thread(_flush, self.hr_email, True):
+                outbox.notify()
+            return
+        self._batch_full = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Contact digest enabled: every {CONTACT_DIGEST_INTERVAL:g}s or {CONTACT_DIGEST_MAX_BATCH} inquiries")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        # Poll often enough that the oldest inquiry is never held much longer than the interval
+        poll = min(CONTACT_DIGEST_INTERVAL, 10.0)
+        while True:
+            try:
+                sent = await asyncio.to_thread(_flush, self.hr_email)
+            except Exception as e:
+                # Keep the inquiries buffered and try again on the next poll
+                logger.error(f"Could not flush contact digest: {str(e)}")
+                sent = 0
+            if sent:
+                logger.info(f"Queued contact digest with {sent} inquiries")
+                outbox.notify()
+                continue
+            self._batch_full.clear()
+            try:
+                await asyncio.wait_for(self._batch_full.wait(), poll)
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,88 @@
+import re
+from urllib.parse import quote
+
+import aiofiles
+from fastapi import Request
+from fastapi.responses import Response, StreamingResponse
+
+from uploads import UPLOAD_CHUNK_SIZE
+
+# bytes=<start>-<end>, bytes=<start>- or bytes=-<suffix length>; other forms are answered with the whole file
+_RANGE = re.compile(r"bytes=(\d*)-(\d*)")
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    """Whether an If-None-Match header lists etag (weak comparison, as RFC 9110 asks for)"""
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag.removeprefix("W/") for tag in header.split(","))
+
+
+def parse_range(header: str, size: int):
+    """(start, end) inclusive byte positions requested by a Range header, or None for the whole file
+
+    Raises ValueError when the range lies entirely outside the file.
+    """
+    match = _RANGE.fullmatch(header.strip()) if header else None
+    if match is None or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if not first:
+        # The last N bytes
+        if not int(last):
+            raise ValueError(f"Range {header} is empty")
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError(f"Range {header} not satisfiable for {size} bytes")
+    return start, end
+
+
+def content_disposition(filename: str) -> str:
+    """attachment header value with an ASCII fallback name and the UTF-8 original"""
+    fallback = filename.encode("ascii", "replace").decode().replace('"', "_").replace("?", "_")
+    return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename)}"
+
+
+async def iter_file(path: str, start: int, end: int, chunk_size: int = UPLOAD_CHUNK_SIZE):
+    """Read bytes start..end (inclusive) of a file in fixed-size chunks"""
+    remaining = end - start + 1
+    async with aiofiles.open(path, "rb") as f:
+        await f.seek(start)
+        while remaining > 0:
+            chunk = await f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def file_response(request: Request, path: str, size: int, etag: str, media_type: str, headers: dict = None):
+    """Stream a file with conditional (ETag) and single-range request support
+
+    Answers 304 when the client's copy is current, 206 for a satisfiable
+    Range (honouring If-Range), 416 for an unsatisfiable one and 200 with
+    the whole file otherwise. The file is read in chunks as it is sent.
+    """
+    headers = {**(headers or {}), "ETag": etag, "Accept-Ranges": "bytes"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    start, end, status = 0, size - 1, 200
+    if_range = request.headers.get("if-range")
+    # A Range is only honoured against the version the client already has part of
+    if not if_range or if_range.strip() == etag:
+        try:
+            byte_range = parse_range(request.headers.get("range"), size)
+        except ValueError:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+        if byte_range is not None:
+            (start, end), status = byte_range, 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(iter_file(path, start, end), status_code=status, media_type=media_type, headers=headers)
@@ -0,0 +1,181 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import logging
+from collections import OrderedDict
+
+from fastapi.responses import Response
+
+logger = logging.getLogger(__name__)
+
+# Idempotency configuration
+DATA_DIR = os.getenv("DATA_DIR", "data")
+# Seconds a result is replayed for duplicates of the same submission
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "600"))
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+# "memory" keeps results per worker process; "sqlite" also shares them between workers
+IDEMPOTENCY_BACKEND = os.getenv("IDEMPOTENCY_BACKEND", "memory").lower()
+IDEMPOTENCY_DB = os.getenv("IDEMPOTENCY_DB", os.path.join(DATA_DIR, "idempotency.db"))
+
+MAX_KEY_LENGTH = 255
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS idempotency (
+    key TEXT PRIMARY KEY,
+    status_code INTEGER NOT NULL,
+    body BLOB NOT NULL,
+    expires_at REAL NOT NULL
+)
+"""
+
+
+def header_key(route: str, idempotency_key: str):
+    """Cache key for a client-supplied Idempotency-Key header, or None if there is none"""
+    if not idempotency_key:
+        return None
+    idempotency_key = idempotency_key.strip()[:MAX_KEY_LENGTH]
+    return f"{route}:key:{idempotency_key}" if idempotency_key else None
+
+
+def payload_key(route: str, fields: dict, content_sha256: str = None):
+    """Cache key derived from the normalized submission (and uploaded file hash)"""
+    normalized = {
+        name: value.strip().lower() if name == "email" else value.strip() if isinstance(value, str) else value
+        for name, value in fields.items()
+    }
+    digest = hashlib.sha256(json.dumps(normalized, sort_keys=True).encode("utf-8"))
+    if content_sha256:
+        digest.update(content_sha256.encode("ascii"))
+    return f"{route}:payload:{digest.hexdigest()}"
+
+
+class _SQLiteStore:
+    """Results shared between worker processes"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str):
+        row = self._connect().execute(
+            "SELECT status_code, body, expires_at FROM idempotency WHERE key = ? AND expires_at > ?",
+            (key, time.time())
+        ).fetchone()
+        return row
+
+    def put(self, key: str, status_code: int, body: bytes, expires_at: float):
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO idempotency (key, status_code, body, expires_at) VALUES (?, ?, ?, ?)",
+            (key, status_code, body, expires_at)
+        )
+        # Expired rows are cleared as new ones arrive, so the table stays small
+        conn.execute("DELETE FROM idempotency WHERE expires_at <= ?", (time.time(),))
+
+
+class IdempotencyCache:
+    """LRU + TTL cache of submission results, replayed for duplicate requests"""
+
+    def __init__(self, ttl: float = IDEMPOTENCY_TTL, max_size: int = IDEMPOTENCY_CACHE_SIZE, backend: str = IDEMPOTENCY_BACKEND):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()  # key -> (status_code, body, expires_at)
+        self._inflight = {}
+        self._shared = _SQLiteStore(IDEMPOTENCY_DB) if backend == "sqlite" else None
+
+    def _get_local(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[2] <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _put_local(self, key: str, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def get(self, key: str):
+        entry = self._get_local(key)
+        if entry is None and self._shared is not None:
+            try:
+                entry = await asyncio.to_thread(self._shared.get, key)
+            except sqlite3.Error as e:
+                logger.warning(f"Shared idempotency store unavailable: {str(e)}")
+            if entry is not None:
+                self._put_local(key, tuple(entry))
+        return entry
+
+    async def put(self, key: str, status_code: int, body: bytes):
+        entry = (status_code, body, time.time() + self.ttl)
+        self._put_local(key, entry)
+        if self._shared is not None:
+            try:
+                await asyncio.to_thread(self._shared.put, key, *entry)
+            except sqlite3.Error as e:
+                logger.warning(f"Shared idempotency store unavailable: {str(e)}")
+
+    @staticmethod
+    def _replay(entry):
+        status_code, body, _ = entry
+        return Response(
+            content=body,
+            status_code=status_code,
+            media_type="application/json",
+            headers={"Idempotent-Replayed": "true"}
+        )
+
+    async def run(self, key: str, handler):
+        """Return (response, replayed)
+
+        Runs handler() for the first request with this key and caches its
+        successful response; duplicates that arrive while it is still running,
+        or within the TTL afterwards, get that response replayed instead.
+        """
+        while True:
+            entry = await self.get(key)
+            if entry is not None:
+                return self._replay(entry), True
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                break
+            entry = await asyncio.shield(inflight)
+            if entry is not None:
+                return self._replay(entry), True
+            # That attempt failed; look again, another waiting duplicate may already have taken over
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        entry = None
+        try:
+            response = await handler()
+            if 200 <= response.status_code < 300:
+                await self.put(key, response.status_code, response.body)
+                entry = self._entries.get(key)
+            return response, False
+        finally:
+            # Wake the waiters first, so nothing below can leave them hanging
+            future.set_result(entry)
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+
+idempotency_cache = IdempotencyCache()
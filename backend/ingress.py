@@ -0,0 +1,238 @@
+import math
+import os
+import secrets
+import time
+import logging
+from collections import deque
+
+from starlette.responses import JSONResponse
+
+from metrics import inc
+from uploads import MAX_RESUME_BYTES
+
+logger = logging.getLogger(__name__)
+
+# Per client IP and route: "<path>=<requests>/<seconds>", comma separated
+RATE_LIMITS = os.getenv("RATE_LIMITS", "/api/job-application=5/60,/api/contact=10/60,/api/job-applications/bulk=20/3600")
+# Submissions processed at once across all clients before new ones are shed with 503; 0 disables
+MAX_INFLIGHT_SUBMISSIONS = int(os.getenv("MAX_INFLIGHT_SUBMISSIONS", "64"))
+# Take the client IP from X-Forwarded-For (only behind a trusted proxy)
+TRUST_PROXY_HEADERS = os.getenv("TRUST_PROXY_HEADERS", "false").lower() in ("1", "true", "yes")
+# Number of trusted proxies in front of the app; the client IP is the address the outermost one added
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "1"))
+
+# Largest request body accepted for a job application: the resume plus room for the other form fields
+MAX_APPLICATION_BODY_BYTES = int(os.getenv("MAX_APPLICATION_BODY_BYTES", str(MAX_RESUME_BYTES + 1024 * 1024)))
+# Largest request body accepted for a bulk import: the rows file plus the resumes zip
+BULK_MAX_BODY_BYTES = int(os.getenv("BULK_MAX_BODY_BYTES", str(200 * 1024 * 1024)))
+
+# Drop idle client windows after this many requests so memory stays bounded
+_SWEEP_EVERY = 1000
+
+
+def parse_rate_limits(spec: str):
+    """Parse RATE_LIMITS into {path: (limit, window_seconds)}"""
+    rules = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        path, _, rate = item.partition("=")
+        limit, _, window = rate.partition("/")
+        rules[path.strip()] = (int(limit), float(window or 60))
+    return rules
+
+
+def bearer_status(authorization: str, tokens):
+    """None when authorization carries one of tokens, else the status to refuse the request with
+
+    404 while no token is configured (the route is disabled), 401 otherwise.
+    """
+    tokens = [token for token in tokens if token]
+    if not tokens:
+        return 404
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not any(secrets.compare_digest(token, expected) for expected in tokens):
+        return 401
+    return None
+
+
+class BodyTooLarge(Exception):
+    """Raised from receive() once a request body passes its route's limit"""
+
+
+class IngressLimiter:
+    """ASGI middleware that rejects excess submissions before their body is read
+
+    Each client IP gets a sliding window per limited route. Independently,
+    requests to limited routes are shed once MAX_INFLIGHT_SUBMISSIONS are
+    already being processed. Rejections never touch the request body, so a
+    refused multipart upload costs no parsing, disk or SMTP work. Routes in
+    body_limits get a 413 as soon as their body is known to be too large:
+    from Content-Length before anything is read, or mid-stream for chunked
+    uploads, instead of after the whole body has been spooled to disk.
+    Routes in auth ({path: bearer tokens}) are refused with 401 before their
+    body is read when the Authorization header carries none of the tokens.
+    """
+
+    def __init__(self, app, rules: dict = None, max_inflight: int = MAX_INFLIGHT_SUBMISSIONS,
+                 trust_proxy_headers: bool = TRUST_PROXY_HEADERS, proxy_hops: int = TRUSTED_PROXY_HOPS,
+                 body_limits: dict = None, auth: dict = None):
+        self.app = app
+        self.rules = parse_rate_limits(RATE_LIMITS) if rules is None else rules
+        self.body_limits = {
+            "/api/job-application": MAX_APPLICATION_BODY_BYTES,
+            "/api/job-applications/bulk": BULK_MAX_BODY_BYTES,
+        } if body_limits is None else body_limits
+        self.auth = auth or {}
+        self.max_inflight = max_inflight
+        self.trust_proxy_headers = trust_proxy_headers
+        self.proxy_hops = max(proxy_hops, 1)
+        self.inflight = 0
+        self._windows = {}  # (client, path) -> deque of request times
+        self._requests = 0
+
+    def _client(self, scope) -> str:
+        if self.trust_proxy_headers:
+            forwarded = [
+                address.strip()
+                for name, value in scope.get("headers", ())
+                if name == b"x-forwarded-for"
+                for address in value.decode("latin-1").split(",")
+                if address.strip()
+            ]
+            # Every proxy appends the address it got the request from, so only the last
+            # proxy_hops entries are ours; anything to their left is whatever the client sent
+            if forwarded:
+                return forwarded[-min(self.proxy_hops, len(forwarded))]
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    def _sweep(self, now: float):
+        longest = max((window for _, window in self.rules.values()), default=0)
+        stale = [key for key, hits in self._windows.items() if not hits or hits[-1] <= now - longest]
+        for key in stale:
+            del self._windows[key]
+
+    def _retry_after(self, path: str, client: str, now: float):
+        """Seconds until the client may call path again, or None if it may now"""
+        limit, window = self.rules[path]
+        hits = self._windows.setdefault((client, path), deque())
+        while hits and hits[0] <= now - window:
+            hits.popleft()
+        if len(hits) >= limit:
+            return hits[0] + window - now
+        hits.append(now)
+        return None
+
+    @staticmethod
+    def _reject(status_code: int, retry_after: float, message: str):
+        return JSONResponse(
+            status_code=status_code,
+            content={"success": False, "message": message},
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+        )
+
+    @staticmethod
+    def _unauthorized(status_code: int):
+        # Same responses as the routes' own token check, which still runs afterwards
+        if status_code == 404:
+            return JSONResponse(status_code=404, content={"detail": "Not Found"})
+        return JSONResponse(
+            status_code=401,
+            content={"detail": "Invalid or missing API token"},
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+
+    @staticmethod
+    def _too_large(limit: int):
+        return JSONResponse(
+            status_code=413,
+            content={"success": False, "message": f"Upload must be at most {limit / (1024 * 1024):.1f} MB"},
+            headers={"Connection": "close"}
+        )
+
+    async def _call_capped(self, scope, receive, send, limit: int):
+        """Run the app, cutting the request body off once it passes limit bytes"""
+        for name, value in scope.get("headers", ()):
+            if name == b"content-length" and value.isdigit() and int(value) > limit:
+                # Rejections are counted rather than logged one by one; a flood must not flood the logs too
+                inc("ingress_rejections_total", path=scope["path"], reason="too_large")
+                logger.debug("Rejecting %s: Content-Length %s is over %s bytes", scope["path"], int(value), limit)
+                await self._too_large(limit)(scope, receive, send)
+                return
+
+        received = 0
+        exceeded = started = False
+
+        async def capped_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    exceeded = True
+                    raise BodyTooLarge(limit)
+            return message
+
+        async def guarded_send(message):
+            nonlocal started
+            # Once the body was cut off, whatever error the app makes of it is replaced by the 413 below
+            if not exceeded:
+                started = True
+                await send(message)
+
+        try:
+            await self.app(scope, capped_receive, guarded_send)
+        except BodyTooLarge:
+            pass
+        if exceeded and not started:
+            inc("ingress_rejections_total", path=scope["path"], reason="too_large")
+            logger.debug("Rejecting %s: body passed %s bytes", scope["path"], limit)
+            await self._too_large(limit)(scope, receive, send)
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path")
+        if scope["type"] != "http" or scope["method"] == "OPTIONS" or (
+                path not in self.rules and path not in self.body_limits and path not in self.auth):
+            await self.app(scope, receive, send)
+            return
+        if path in self.auth:
+            authorization = next((value.decode("latin-1") for name, value in scope.get("headers", ()) if name == b"authorization"), None)
+            status_code = bearer_status(authorization, self.auth[path])
+            if status_code is not None:
+                inc("ingress_rejections_total", path=path, reason="unauthorized")
+                await self._unauthorized(status_code)(scope, receive, send)
+                return
+        if path not in self.rules:
+            if path in self.body_limits:
+                await self._call_capped(scope, receive, send, self.body_limits[path])
+            else:
+                await self.app(scope, receive, send)
+            return
+
+        if self.max_inflight and self.inflight >= self.max_inflight:
+            inc("ingress_rejections_total", path=path, reason="shed")
+            logger.debug("Shedding %s: %s submissions already in flight", path, self.inflight)
+            response = self._reject(503, 1, "We are receiving a high volume of submissions. Please try again in a moment.")
+            await response(scope, receive, send)
+            return
+
+        now = time.monotonic()
+        self._requests += 1
+        if self._requests % _SWEEP_EVERY == 0:
+            self._sweep(now)
+        client = self._client(scope)
+        retry_after = self._retry_after(path, client, now)
+        if retry_after is not None:
+            inc("ingress_rejections_total", path=path, reason="rate_limited")
+            logger.debug("Rate limit exceeded for %s on %s", client, path)
+            response = self._reject(429, retry_after, "Too many submissions. Please wait a moment and try again.")
+            await response(scope, receive, send)
+            return
+
+        self.inflight += 1
+        try:
+            if path in self.body_limits:
+                await self._call_capped(scope, receive, send, self.body_limits[path])
+            else:
+                await self.app(scope, receive, send)
+        finally:
+            self.inflight -= 1
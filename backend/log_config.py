@@ -0,0 +1,196 @@
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+import uuid
+import zlib
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# Logging configuration
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "text" keeps the classic "LEVEL:logger:message" lines, "json" writes one JSON object per line
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+# Fraction of requests whose info/debug lines are kept; the choice is per request ID, so a
+# sampled request keeps all of its lines. Warnings and errors are always kept.
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1"))
+# Info/debug lines per second above which further ones are dropped (0 disables)
+LOG_RATE_LIMIT = float(os.getenv("LOG_RATE_LIMIT", "0"))
+
+REQUEST_ID_HEADER = b"x-request-id"
+MAX_REQUEST_ID_LENGTH = 64
+
+request_id_var = contextvars.ContextVar("request_id", default=None)
+
+# LogRecord attributes that are not user-supplied extras
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id", "dropped"}
+
+_listener = None
+
+
+def current_request_id():
+    return request_id_var.get()
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamps the request ID on each record and applies sampling and rate limiting
+
+    Runs on the logging thread before the record is queued, so it must stay cheap.
+    """
+
+    def __init__(self, sample_rate: float = LOG_SAMPLE_RATE, rate_limit: float = LOG_RATE_LIMIT):
+        super().__init__()
+        self.sample_rate = sample_rate
+        self.rate_limit = rate_limit
+        self._tokens = rate_limit
+        self._updated = time.monotonic()
+        self._dropped = 0
+        self._lock = threading.Lock()
+
+    def _sampled(self, request_id: str) -> bool:
+        if self.sample_rate >= 1:
+            return True
+        # A checksum rather than hash() so every worker process makes the same choice for a request
+        return zlib.crc32(request_id.encode()) / 0xFFFFFFFF < self.sample_rate
+
+    def _allowed(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.rate_limit, self._tokens + (now - self._updated) * self.rate_limit)
+            self._updated = now
+            if self._tokens < 1:
+                self._dropped += 1
+                return False
+            self._tokens -= 1
+            return True
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        request_id = request_id_var.get()
+        record.request_id = request_id
+        if record.levelno < logging.WARNING:
+            if request_id is not None and not self._sampled(request_id):
+                return False
+            if self.rate_limit and not self._allowed():
+                return False
+        if self._dropped:
+            # Report what the rate limit swallowed on the next record that gets through
+            with self._lock:
+                record.dropped, self._dropped = self._dropped, 0
+        return True
+
+
+class LazyQueueHandler(QueueHandler):
+    """QueueHandler that leaves message formatting to the listener thread
+
+    The stock handler formats every record on the calling thread before
+    queueing it; here only exception info is rendered eagerly, because the
+    traceback would not survive until the listener gets to it.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message, request_id and any extras"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.request_id:
+            entry["request_id"] = record.request_id
+        if getattr(record, "dropped", 0):
+            entry["dropped"] = record.dropped
+        for name, value in vars(record).items():
+            if name not in _RECORD_FIELDS and not name.startswith("_"):
+                entry[name] = value
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """The basicConfig line format, with the request ID appended when there is one"""
+
+    def __init__(self):
+        super().__init__(logging.BASIC_FORMAT)
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        if record.request_id:
+            line += f" [request_id={record.request_id}]"
+        if getattr(record, "dropped", 0):
+            line += f" [{record.dropped} log lines dropped]"
+        return line
+
+
+def configure_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT):
+    """Route all logging, including uvicorn's, through a queue drained by a background thread
+
+    Callers only pay for the filter and a queue put; formatting and writing
+    to stderr happen on the listener thread.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    output = logging.StreamHandler(sys.stderr)
+    output.setFormatter(JSONFormatter() if fmt == "json" else TextFormatter())
+
+    records = queue.SimpleQueue()
+    handler = LazyQueueHandler(records)
+    handler.addFilter(RequestContextFilter())
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(level)
+    # uvicorn installs its own handlers; send its records through the same queue
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers = []
+        uvicorn_logger.propagate = True
+
+    _listener = QueueListener(records, output)
+    _listener.start()
+    # Flush what is still queued when the process exits
+    atexit.register(_listener.stop)
+
+
+class RequestIdMiddleware:
+    """Gives every request an ID (the client's X-Request-ID if sent) for log records and the response"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_id = None
+        for name, value in scope.get("headers", ()):
+            if name == REQUEST_ID_HEADER:
+                request_id = value.decode("latin-1").strip()[:MAX_REQUEST_ID_LENGTH] or None
+                break
+        request_id = request_id or uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", []).append((REQUEST_ID_HEADER, request_id.encode("latin-1")))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_id_var.reset(token)
@@ -0,0 +1,133 @@
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+import os
+from datetime import datetime
+import logging
+import asyncio
+import functools
+import contextvars
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from smtp_pool import SMTPPool
+from smtp_transport import SMTP_USERNAME, TransportSelector, default_transports
+from mime_stream import StreamingMessage, send_streamed
+from send_limiter import send_limiter
+from metrics import inc, stage_timer
+
+logger = logging.getLogger(__name__)
+
+# Email configuration (server, credentials and failover live in smtp_transport.py)
+
+# Number of threads that may talk to the SMTP server at the same time.
+# smtplib is blocking, so every send runs on this pool instead of the event loop.
+MAIL_WORKERS = int(os.getenv("MAIL_WORKERS", "4"))
+
+# Authenticated SMTP sessions kept open between emails
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", str(MAIL_WORKERS)))
+SMTP_POOL_IDLE_TIMEOUT = float(os.getenv("SMTP_POOL_IDLE_TIMEOUT", "60"))
+
+_mail_executor = None
+
+
+# Failover between the configured SMTP transports; see smtp_transport.py
+transports = TransportSelector(default_transports())
+
+smtp_pool = SMTPPool(transports.connect, max_size=SMTP_POOL_SIZE, idle_timeout=SMTP_POOL_IDLE_TIMEOUT)
+
+
+def deliver_email(to_email: str, subject: str, body: str, attachment_path: str = None, reply_to: str = None, from_name: str = None, text_body: str = None, attachment_name: str = None):
+    """Build and send one email, raising the SMTP error if delivery fails"""
+    try:
+        _deliver_email(to_email, subject, body, attachment_path, reply_to, from_name, text_body, attachment_name)
+    except Exception as e:
+        inc("email_failures_total", error=type(e).__name__)
+        raise
+    inc("emails_sent_total")
+    return True
+
+
+def _deliver_email(to_email: str, subject: str, body: str, attachment_path: str, reply_to: str, from_name: str, text_body: str, attachment_name: str):
+    logger.debug("Building email to %s", to_email)
+    
+    msg = MIMEMultipart('mixed')
+    
+    # Improved headers for better deliverability
+    msg['From'] = f"Talvyn Technologies <{SMTP_USERNAME}>"
+    msg['To'] = to_email
+    msg['Subject'] = subject
+    msg['Message-ID'] = f"<{uuid.uuid4()}@talvyntechnologies.com>"
+    msg['Date'] = datetime.now().strftime("%a, %d %b %Y %H:%M:%S %z")
+    
+    # Add important headers for spam prevention
+    msg['X-Mailer'] = 'Talvyn Technologies Application v1.0'
+    msg['X-Priority'] = '3'
+    msg['Importance'] = 'Normal'
+    
+    if reply_to:
+        msg['Reply-To'] = reply_to
+    
+    # The body comes fully rendered from the templates; send a plain-text
+    # alternative alongside the HTML when one is available
+    if text_body:
+        alternative = MIMEMultipart('alternative')
+        alternative.attach(MIMEText(text_body, 'plain', 'utf-8'))
+        alternative.attach(MIMEText(body, 'html', 'utf-8'))
+        msg.attach(alternative)
+    else:
+        msg.attach(MIMEText(body, 'html', 'utf-8'))
+    
+    # Add attachment if provided; it is base64-encoded in chunks while the
+    # message is written out, never held in memory as a whole
+    message = StreamingMessage(msg)
+    if attachment_path and os.path.exists(attachment_path):
+        message.attach_file(attachment_path, attachment_name or os.path.basename(attachment_path))
+    
+    with message.spool() as fp:
+        waited = None
+        
+        def deliver(server):
+            nonlocal waited
+            # Stay under the provider's rate limit; this only waits when the shared budget is used up.
+            # The token is taken once a session exists, so failed connects cost none, and only once
+            # even when the pool retries on a fresh session.
+            if waited is None:
+                waited = send_limiter.acquire()
+                if waited:
+                    logger.info("Send rate limit reached, waited %.2fs", waited)
+            fp.seek(0)
+            # Only the transfer itself; connect, STARTTLS and login are timed as their own stages
+            with stage_timer("smtp_send"):
+                return send_streamed(server, SMTP_USERNAME, [to_email], fp)
+        
+        # The pool reuses an already authenticated session when one is available
+        refused = smtp_pool.send(deliver)
+    
+    if refused:
+        logger.warning("Some recipients were refused: %s", refused)
+    
+    logger.info("Email sent to %s", to_email)
+
+def _get_executor():
+    global _mail_executor
+    if _mail_executor is None:
+        _mail_executor = ThreadPoolExecutor(max_workers=MAIL_WORKERS, thread_name_prefix="mail")
+    return _mail_executor
+
+
+async def deliver_email_async(to_email: str, subject: str, body: str, attachment_path: str = None, reply_to: str = None, from_name: str = None, text_body: str = None, attachment_name: str = None):
+    """Send email on the mail thread pool without blocking the event loop, raising the delivery error"""
+    loop = asyncio.get_running_loop()
+    # Run in a copy of the caller's context so the send's log lines keep its request ID
+    return await loop.run_in_executor(
+        _get_executor(),
+        functools.partial(contextvars.copy_context().run, deliver_email, to_email, subject, body, attachment_path, reply_to=reply_to, from_name=from_name, text_body=text_body, attachment_name=attachment_name)
+    )
+
+
+def shutdown_mail_executor(wait: bool = True):
+    """Stop the mail thread pool, letting queued sends finish when wait is True, and close pooled SMTP sessions"""
+    global _mail_executor
+    if _mail_executor is not None:
+        _mail_executor.shutdown(wait=wait)
+        _mail_executor = None
+    smtp_pool.close()
@@ -0,0 +1,222 @@
+import asyncio
+import bisect
+import json
+import os
+import threading
+import time
+import logging
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Metrics configuration
+DATA_DIR = os.getenv("DATA_DIR", "data")
+# Each worker process writes its totals here so /metrics can sum all workers
+METRICS_DIR = os.getenv("METRICS_DIR", os.path.join(DATA_DIR, "metrics"))
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "5"))
+# Files not rewritten for this long belong to workers that have exited and are deleted
+METRICS_STALE_AFTER = float(os.getenv("METRICS_STALE_AFTER", str(max(12 * METRICS_FLUSH_INTERVAL, 60))))
+
+PREFIX = "talvyn_"
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# name -> (type, help)
+_METRICS = {
+    "stage_seconds": ("histogram", "Time spent in each stage of handling a submission"),
+    "http_requests_total": ("counter", "HTTP requests by handler and status code"),
+    "emails_sent_total": ("counter", "Emails delivered to the SMTP server"),
+    "email_failures_total": ("counter", "Failed email deliveries by exception class"),
+    "smtp_connect_failures_total": ("counter", "Failed SMTP connection attempts by transport"),
+    "resume_sweep_seconds": ("histogram", "Duration of the background resume store sweeps"),
+    "ingress_rejections_total": ("counter", "Requests refused by the ingress limiter by route and reason"),
+}
+
+_shards = []
+_shards_lock = threading.Lock()
+_local = threading.local()
+_process_id = f"{os.getpid()}-{int(time.time())}"
+
+
+def _shard():
+    """This thread's private counters; only the owning thread ever writes to it"""
+    shard = getattr(_local, "shard", None)
+    if shard is None:
+        shard = {}
+        _local.shard = shard
+        with _shards_lock:
+            _shards.append(shard)
+    return shard
+
+
+def inc(name: str, amount: float = 1.0, **labels):
+    """Increment a counter"""
+    key = (name, tuple(sorted(labels.items())))
+    shard = _shard()
+    shard[key] = shard.get(key, 0.0) + amount
+
+
+def observe(name: str, value: float, **labels):
+    """Record one histogram observation"""
+    key = (name, tuple(sorted(labels.items())))
+    shard = _shard()
+    data = shard.get(key)
+    if data is None:
+        # One slot per bucket plus +Inf, then sum and count
+        data = shard[key] = [0] * (len(LATENCY_BUCKETS) + 1) + [0.0, 0]
+    data[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+    data[-2] += value
+    data[-1] += 1
+
+
+@contextmanager
+def stage_timer(stage: str):
+    """Time a block as one stage of submission handling"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe("stage_seconds", time.perf_counter() - start, stage=stage)
+
+
+def _merge(total: dict, key, value):
+    current = total.get(key)
+    if current is None:
+        total[key] = list(value) if isinstance(value, list) else value
+    elif isinstance(value, list):
+        for i, v in enumerate(value):
+            current[i] += v
+    else:
+        total[key] = current + value
+
+
+def snapshot():
+    """Totals of every thread in this process"""
+    with _shards_lock:
+        shards = list(_shards)
+    total = {}
+    for shard in shards:
+        for key, value in list(shard.items()):
+            _merge(total, key, value)
+    return total
+
+
+def flush():
+    """Write this process's totals for other workers' /metrics to pick up"""
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    path = os.path.join(METRICS_DIR, f"{_process_id}.json")
+    entries = [[name, dict(labels), value] for (name, labels), value in snapshot().items()]
+    with open(path + ".tmp", "w") as f:
+        json.dump(entries, f)
+    os.replace(path + ".tmp", path)
+
+
+async def flush_periodically():
+    """Background task that keeps this worker's file current"""
+    while True:
+        await asyncio.sleep(METRICS_FLUSH_INTERVAL)
+        try:
+            await asyncio.to_thread(flush)
+        except OSError as e:
+            logger.warning(f"Could not write metrics file: {str(e)}")
+
+
+def _collect_all():
+    """Totals across every worker process: live values for this one, flushed files for the rest
+
+    Files of workers that stopped flushing are deleted, so METRICS_DIR does
+    not grow with every restart; their counts drop out of the totals, which
+    Prometheus treats like a counter reset.
+    """
+    total = snapshot()
+    if not os.path.isdir(METRICS_DIR):
+        return total
+    own = f"{_process_id}.json"
+    stale_before = time.time() - METRICS_STALE_AFTER
+    for filename in os.listdir(METRICS_DIR):
+        if not filename.endswith((".json", ".tmp")) or filename == own:
+            continue
+        path = os.path.join(METRICS_DIR, filename)
+        try:
+            if os.path.getmtime(path) < stale_before:
+                os.remove(path)
+                continue
+            if filename.endswith(".tmp"):
+                continue
+            with open(path) as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for name, labels, value in entries:
+            _merge(total, (name, tuple(sorted(labels.items()))), value)
+    return total
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def render(gauges: dict = None):
+    """Prometheus text exposition of all metrics
+
+    gauges maps a metric name to (help, {labels tuple: value}) for values
+    computed at scrape time, such as queue depth.
+    """
+    total = _collect_all()
+    lines = []
+    for name, (kind, help_text) in _METRICS.items():
+        series = sorted((labels, value) for (n, labels), value in total.items() if n == name)
+        lines.append(f"# HELP {PREFIX}{name} {help_text}")
+        lines.append(f"# TYPE {PREFIX}{name} {kind}")
+        for labels, value in series:
+            if kind == "counter":
+                lines.append(f"{PREFIX}{name}{_format_labels(labels)} {value:g}")
+                continue
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), value[:-2]):
+                cumulative += count
+                lines.append(f"{PREFIX}{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{PREFIX}{name}_sum{_format_labels(labels)} {value[-2]:.6f}")
+            lines.append(f"{PREFIX}{name}_count{_format_labels(labels)} {value[-1]}")
+    for name, (help_text, values) in (gauges or {}).items():
+        lines.append(f"# HELP {PREFIX}{name} {help_text}")
+        lines.append(f"# TYPE {PREFIX}{name} gauge")
+        for labels, value in sorted(values.items()):
+            lines.append(f"{PREFIX}{name}{_format_labels(labels)} {value:g}")
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """Counts requests and stamps their arrival time for the parse stage timer"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        scope.setdefault("state", {})["request_start"] = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # Label by handler name rather than raw path to keep the number of series bounded
+            handler = getattr(scope.get("endpoint"), "__name__", "unmatched")
+            inc("http_requests_total", handler=handler, status=str(status["code"]))
+
+
+def parse_elapsed(request) -> None:
+    """Record the time from arrival until the handler started, i.e. body upload and parsing"""
+    start = getattr(request.state, "request_start", None)
+    if start is not None:
+        observe("stage_seconds", time.perf_counter() - start, stage="parse")
@@ -0,0 +1,124 @@
+import base64
+import os
+import smtplib
+import tempfile
+import uuid
+from email.mime.base import MIMEBase
+
+# Messages smaller than this stay in memory, larger ones are spooled to a temp file
+MIME_SPOOL_MAX = int(os.getenv("MIME_SPOOL_MAX", str(1024 * 1024)))
+# Raw bytes read per base64 step; a multiple of 57 so every output line is a full 76 characters
+MIME_CHUNK_SIZE = 57 * 1024
+
+# Flush the DATA buffer to the socket once it holds this many bytes
+_SEND_BUFFER = 64 * 1024
+
+
+class StreamingMessage:
+    """A MIME message whose file attachments are base64-encoded chunk by chunk
+
+    The headers and text parts are generated by the email package as usual.
+    Each attachment is represented in that skeleton by a one-line placeholder,
+    which write_to() replaces with the encoded file contents as it copies.
+    """
+
+    def __init__(self, msg):
+        self.msg = msg
+        self._attachments = {}
+
+    def attach_file(self, path: str, filename: str, maintype: str = 'application', subtype: str = 'octet-stream'):
+        marker = f"attachment-{uuid.uuid4().hex}"
+        part = MIMEBase(maintype, subtype)
+        part.set_payload(marker)
+        part['Content-Transfer-Encoding'] = 'base64'
+        part.add_header('Content-Disposition', 'attachment', filename=filename)
+        self.msg.attach(part)
+        self._attachments[marker.encode('ascii')] = path
+
+    def write_to(self, fp):
+        """Write the message with CRLF line endings to a binary file object"""
+        # Same generator settings smtplib.send_message uses
+        skeleton = self.msg.as_bytes(policy=self.msg.policy.clone(linesep='\r\n'))
+        for line in skeleton.splitlines(keepends=True):
+            path = self._attachments.get(line.strip())
+            if path is None:
+                fp.write(line)
+                continue
+            with open(path, 'rb') as f:
+                while True:
+                    chunk = f.read(MIME_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    fp.write(base64.encodebytes(chunk).replace(b'\n', b'\r\n'))
+
+    def spool(self):
+        """Render the message into a spooled temp file positioned at the start"""
+        fp = tempfile.SpooledTemporaryFile(max_size=MIME_SPOOL_MAX)
+        self.write_to(fp)
+        fp.seek(0)
+        return fp
+
+
+def send_streamed(server: smtplib.SMTP, from_addr: str, to_addrs, fp):
+    """Send a rendered message from a binary file object through SMTP DATA
+
+    Mirrors smtplib.SMTP.sendmail, but copies the message to the socket line by
+    line (with dot-stuffing) instead of building it as one string first.
+    Returns the dict of refused recipients like sendmail does.
+    """
+    if isinstance(to_addrs, str):
+        to_addrs = [to_addrs]
+    server.ehlo_or_helo_if_needed()
+    code, resp = server.mail(from_addr)
+    if code != 250:
+        if code == 421:
+            server.close()
+        else:
+            server._rset()
+        raise smtplib.SMTPSenderRefused(code, resp, from_addr)
+
+    refused = {}
+    for addr in to_addrs:
+        code, resp = server.rcpt(addr)
+        if code not in (250, 251):
+            refused[addr] = (code, resp)
+        if code == 421:
+            server.close()
+            raise smtplib.SMTPRecipientsRefused(refused)
+    if len(refused) == len(to_addrs):
+        server._rset()
+        raise smtplib.SMTPRecipientsRefused(refused)
+
+    code, resp = server.docmd("data")
+    if code != 354:
+        server._rset()
+        raise smtplib.SMTPDataError(code, resp)
+
+    if server.sock is None:
+        raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+    buf = bytearray()
+    line = b''
+    try:
+        for line in fp:
+            if line.startswith(b'.'):
+                buf += b'.'
+            buf += line
+            if len(buf) >= _SEND_BUFFER:
+                server.sock.sendall(buf)
+                buf.clear()
+        if not line.endswith(b'\r\n'):
+            buf += b'\r\n'
+        buf += b'.\r\n'
+        server.sock.sendall(buf)
+    except OSError:
+        server.close()
+        raise smtplib.SMTPServerDisconnected("Server not connected")
+
+    code, resp = server.getreply()
+    if code != 250:
+        if code == 421:
+            server.close()
+        else:
+            server._rset()
+        raise smtplib.SMTPDataError(code, resp)
+    return refused
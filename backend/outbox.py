@@ -0,0 +1,286 @@
+import asyncio
+import logging
+import os
+import random
+import smtplib
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from log_config import current_request_id, request_id_var
+from mailer import deliver_email_async
+from metrics import stage_timer
+
+logger = logging.getLogger(__name__)
+
+# Outbox configuration
+DATA_DIR = os.getenv("DATA_DIR", "data")
+OUTBOX_DB = os.getenv("OUTBOX_DB", os.path.join(DATA_DIR, "outbox.db"))
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", "2"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_RETRY_BASE = float(os.getenv("OUTBOX_RETRY_BASE", "30"))
+OUTBOX_RETRY_MAX = float(os.getenv("OUTBOX_RETRY_MAX", "3600"))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "5"))
+# A message claimed by a worker that died is picked up again after this many seconds
+OUTBOX_LEASE = float(os.getenv("OUTBOX_LEASE", "300"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    to_email TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    body TEXT NOT NULL,
+    text_body TEXT,
+    attachment_path TEXT,
+    attachment_name TEXT,
+    reply_to TEXT,
+    from_name TEXT,
+    -- ID of the API request that queued the message, so its delivery can be traced in the logs
+    request_id TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    lease_until REAL,
+    last_error TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at);
+-- Content-addressed attachments (see resume_store.py); each queued message using one holds a reference
+CREATE TABLE IF NOT EXISTS blobs (
+    sha256 TEXT PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    size INTEGER NOT NULL,
+    refcount INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_used_at REAL NOT NULL,
+    -- Not deleted before this time even when unreferenced, e.g. while a download link to it is valid
+    keep_until REAL
+);
+"""
+
+_local = threading.local()
+
+
+def _connect():
+    """Return this thread's connection to the outbox database"""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        os.makedirs(os.path.dirname(OUTBOX_DB) or ".", exist_ok=True)
+        conn = sqlite3.connect(OUTBOX_DB, timeout=10, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        # WAL lets the API enqueue while workers in other processes drain the queue
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+        _migrate(conn)
+        _local.conn = conn
+    return conn
+
+
+def _migrate(conn):
+    """Add columns introduced after an outbox database was first created"""
+    columns = {row["name"] for row in conn.execute("PRAGMA table_info(outbox)")}
+    if "text_body" not in columns:
+        conn.execute("ALTER TABLE outbox ADD COLUMN text_body TEXT")
+    if "attachment_name" not in columns:
+        conn.execute("ALTER TABLE outbox ADD COLUMN attachment_name TEXT")
+    if "request_id" not in columns:
+        conn.execute("ALTER TABLE outbox ADD COLUMN request_id TEXT")
+    if "keep_until" not in {row["name"] for row in conn.execute("PRAGMA table_info(blobs)")}:
+        conn.execute("ALTER TABLE blobs ADD COLUMN keep_until REAL")
+
+
+def insert_message(conn, m: dict, now: float = None):
+    """Insert one message inside the caller's transaction, returning its id"""
+    now = time.time() if now is None else now
+    return conn.execute(
+        "INSERT INTO outbox (to_email, subject, body, text_body, attachment_path, attachment_name, reply_to, from_name, request_id, next_attempt_at, created_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (m["to_email"], m["subject"], m["body"], m.get("text_body"), m.get("attachment_path"), m.get("attachment_name"),
+         m.get("reply_to"), m.get("from_name"), m.get("request_id", current_request_id()), now, now)
+    ).lastrowid
+
+
+@contextmanager
+def transaction():
+    """Write transaction on the outbox database, for callers that enqueue together with their own changes"""
+    conn = _connect()
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        yield conn
+
+
+def _enqueue(messages):
+    now = time.time()
+    with transaction() as conn:
+        return [insert_message(conn, m, now) for m in messages]
+
+
+def _claim():
+    """Atomically take the next due message, including ones whose worker lease expired"""
+    conn = _connect()
+    now = time.time()
+    return conn.execute(
+        "UPDATE outbox SET status = 'sending', lease_until = ?, attempts = attempts + 1 "
+        "WHERE id = (SELECT id FROM outbox "
+        "            WHERE (status = 'pending' AND next_attempt_at <= ?) "
+        "               OR (status = 'sending' AND lease_until < ?) "
+        "            ORDER BY next_attempt_at LIMIT 1) "
+        "RETURNING *",
+        (now + OUTBOX_LEASE, now, now)
+    ).fetchone()
+
+
+def _mark_sent(row):
+    # Deleting the row and releasing its attachment is the cleanup stage of every sent message
+    with stage_timer("cleanup"):
+        conn = _connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM outbox WHERE id = ?", (row["id"],))
+            attachment = row["attachment_path"]
+            # Stored blobs just lose this message's reference; the resume sweeper deletes them later
+            stored = attachment and conn.execute(
+                "UPDATE blobs SET refcount = MAX(refcount - 1, 0), last_used_at = ? WHERE path = ?",
+                (time.time(), attachment)
+            ).rowcount
+            # Other attachments are removed once no other queued or dead message still needs them
+            still_used = stored or attachment and conn.execute(
+                "SELECT 1 FROM outbox WHERE attachment_path = ? LIMIT 1", (attachment,)
+            ).fetchone()
+        if attachment and not still_used and os.path.exists(attachment):
+            os.remove(attachment)
+
+
+def _mark_failed(row, error: str, permanent: bool):
+    conn = _connect()
+    if permanent or row["attempts"] >= OUTBOX_MAX_ATTEMPTS:
+        conn.execute(
+            "UPDATE outbox SET status = 'dead', lease_until = NULL, last_error = ? WHERE id = ?",
+            (error, row["id"])
+        )
+        return None
+    # Exponential backoff with jitter so retries from several workers do not line up
+    delay = min(OUTBOX_RETRY_MAX, OUTBOX_RETRY_BASE * 2 ** (row["attempts"] - 1))
+    delay *= random.uniform(0.8, 1.2)
+    conn.execute(
+        "UPDATE outbox SET status = 'pending', lease_until = NULL, last_error = ?, next_attempt_at = ? WHERE id = ?",
+        (error, time.time() + delay, row["id"])
+    )
+    return delay
+
+
+def _is_permanent(exc: Exception) -> bool:
+    """Errors that will not go away by retrying the same message"""
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        # 4xx refusals (greylisting, 421 shutting down) are worth retrying
+        return bool(exc.recipients) and all(code >= 500 for code, _ in exc.recipients.values())
+    if isinstance(exc, (smtplib.SMTPDataError, smtplib.SMTPSenderRefused)):
+        return exc.smtp_code >= 500
+    return False
+
+
+def requeue_dead():
+    """Move every dead-lettered message back to the queue, returning how many were requeued"""
+    conn = _connect()
+    cur = conn.execute(
+        "UPDATE outbox SET status = 'pending', attempts = 0, next_attempt_at = ? WHERE status = 'dead'",
+        (time.time(),)
+    )
+    return cur.rowcount
+
+
+def stats():
+    """Number of outbox messages per status"""
+    rows = _connect().execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall()
+    return {status: count for status, count in rows}
+
+
+class Outbox:
+    """Durable email queue drained by background delivery workers"""
+
+    def __init__(self, workers: int = OUTBOX_WORKERS):
+        self.workers = workers
+        self._tasks = []
+        self._wakeup = None
+        self._stopping = False
+
+    async def enqueue(self, *messages):
+        """Persist messages (dicts of deliver_email arguments) and wake the workers"""
+        ids = await asyncio.to_thread(_enqueue, messages)
+        self.notify()
+        return ids
+
+    def notify(self):
+        """Wake idle workers after messages were inserted outside enqueue()"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def start(self):
+        await asyncio.to_thread(_connect)
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._tasks = [asyncio.create_task(self._worker(n)) for n in range(self.workers)]
+        logger.info(f"Outbox started with {self.workers} delivery workers ({OUTBOX_DB})")
+
+    async def stop(self):
+        """Let each worker finish and record the message it is sending, then return"""
+        self._stopping = True
+        self.notify()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self, n: int):
+        # Cancelling a worker mid-delivery would leave its message 'sending' until the lease
+        # expires and send it again after a restart, so stop() only asks the loop to end
+        while not self._stopping:
+            try:
+                row = await asyncio.to_thread(_claim)
+            except sqlite3.Error as e:
+                logger.error(f"Outbox worker {n} could not read the queue: {str(e)}")
+                row = None
+            if row is None:
+                self._wakeup.clear()
+                if self._stopping:
+                    break
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), OUTBOX_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            # Log the delivery under the ID of the request that queued the message
+            token = request_id_var.set(row["request_id"])
+            try:
+                await self._deliver(row)
+            except Exception as e:
+                # The message keeps its lease and is retried once the lease expires
+                logger.error(f"Outbox worker {n} failed to record message {row['id']}: {str(e)}")
+            finally:
+                request_id_var.reset(token)
+
+    async def _deliver(self, row):
+        try:
+            await deliver_email_async(
+                row["to_email"],
+                row["subject"],
+                row["body"],
+                row["attachment_path"],
+                reply_to=row["reply_to"],
+                from_name=row["from_name"],
+                text_body=row["text_body"],
+                attachment_name=row["attachment_name"]
+            )
+        except Exception as e:
+            error = f"{type(e).__name__}: {str(e)}"
+            delay = await asyncio.to_thread(_mark_failed, row, error, _is_permanent(e))
+            if delay is None:
+                logger.error(f"Outbox message {row['id']} to {row['to_email']} moved to dead letter after {row['attempts']} attempts: {error}")
+            else:
+                logger.warning(f"Outbox message {row['id']} to {row['to_email']} failed (attempt {row['attempts']}), retrying in {delay:.0f}s: {error}")
+            return
+        await asyncio.to_thread(_mark_sent, row)
+        logger.info("Outbox message %s delivered to %s", row["id"], row["to_email"])
+
+
+outbox = Outbox()
@@ -0,0 +1,53 @@
+import base64
+import hashlib
+import hmac
+import os
+import re
+import time
+import logging
+from datetime import datetime
+from urllib.parse import urlencode
+
+logger = logging.getLogger(__name__)
+
+# Resume link configuration
+# Resumes larger than this go to HR as a signed download link instead of an attachment (0 disables)
+RESUME_LINK_THRESHOLD_MB = float(os.getenv("RESUME_LINK_THRESHOLD_MB", "0"))
+# Key the links are signed with; links stay off while it is unset
+RESUME_LINK_SECRET = os.getenv("RESUME_LINK_SECRET", "")
+RESUME_LINK_TTL_DAYS = float(os.getenv("RESUME_LINK_TTL_DAYS", "14"))
+# Public address of this API, which the links in HR emails point at
+PUBLIC_API_URL = os.getenv("PUBLIC_API_URL", "http://localhost:8000").rstrip("/")
+
+SHA256_HEX = re.compile(r"[0-9a-f]{64}")
+
+if RESUME_LINK_THRESHOLD_MB and not RESUME_LINK_SECRET:
+    logger.warning("RESUME_LINK_THRESHOLD_MB is set but RESUME_LINK_SECRET is not; resumes stay attached")
+
+
+def use_link(size: int) -> bool:
+    """Whether a resume of this size is sent as a link rather than attached"""
+    return bool(RESUME_LINK_THRESHOLD_MB and RESUME_LINK_SECRET) and size > RESUME_LINK_THRESHOLD_MB * 1024 * 1024
+
+
+def sign(sha256: str, name: str, expires: int) -> str:
+    digest = hmac.new(RESUME_LINK_SECRET.encode(), f"{sha256}\n{name}\n{expires}".encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+
+
+def make_link(sha256: str, name: str, ttl_days: float = RESUME_LINK_TTL_DAYS):
+    """Signed download URL for a stored resume, returning (url, expires as a Unix time)"""
+    expires = int(time.time() + ttl_days * 86400)
+    query = urlencode({"name": name, "expires": expires, "sig": sign(sha256, name, expires)})
+    return f"{PUBLIC_API_URL}/api/resumes/{sha256}?{query}", expires
+
+
+def verify(sha256: str, name: str, expires: int, signature: str) -> bool:
+    """Whether a link's signature is valid and it has not expired"""
+    if not RESUME_LINK_SECRET or not SHA256_HEX.fullmatch(sha256) or expires < time.time():
+        return False
+    return hmac.compare_digest(sign(sha256, name, expires), signature)
+
+
+def format_expiry(expires: int) -> str:
+    return datetime.fromtimestamp(expires).strftime('%Y-%m-%d %H:%M')
@@ -0,0 +1,176 @@
+import asyncio
+import os
+import time
+import uuid
+import logging
+
+import outbox as outbox_db
+from metrics import observe
+from uploads import UPLOAD_DIR, MAX_RESUME_BYTES, save_upload
+
+logger = logging.getLogger(__name__)
+
+# Resume store configuration
+RESUME_STORE_DIR = os.getenv("RESUME_STORE_DIR", os.path.join(UPLOAD_DIR, "blobs"))
+# Resumes no message refers to any more are kept this long after last use, then deleted
+RESUME_RETENTION_DAYS = float(os.getenv("RESUME_RETENTION_DAYS", "30"))
+# Once the store is bigger than this, unreferenced resumes are deleted least recently used first (0 disables)
+RESUME_STORE_QUOTA_MB = float(os.getenv("RESUME_STORE_QUOTA_MB", "2048"))
+RESUME_SWEEP_INTERVAL = float(os.getenv("RESUME_SWEEP_INTERVAL", "3600"))
+
+# Uploads are written here first, on the same filesystem, so moving them into the store is atomic
+_STAGING_DIR = os.path.join(RESUME_STORE_DIR, "staging")
+# Staged files older than this were left behind by a crashed request
+_STAGING_MAX_AGE = 24 * 3600
+# Files the sweeper removes per (short) write transaction
+_UNLINK_BATCH = 50
+
+
+def blob_path(sha256: str) -> str:
+    return os.path.join(RESUME_STORE_DIR, sha256[:2], sha256)
+
+
+def _put(staged_path: str, size: int, sha256: str):
+    """Move a staged upload into the store, or drop it if identical content is already stored
+
+    Takes one reference on the blob for the caller. Returns (path, deduplicated).
+    """
+    path = blob_path(sha256)
+    now = time.time()
+    with outbox_db.transaction() as conn:
+        deduplicated = bool(conn.execute(
+            "SELECT 1 FROM blobs WHERE sha256 = ?", (sha256,)
+        ).fetchone()) and os.path.exists(path)
+        if deduplicated:
+            os.remove(staged_path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(staged_path, path)
+        conn.execute(
+            "INSERT INTO blobs (sha256, path, size, refcount, created_at, last_used_at) VALUES (?, ?, ?, 1, ?, ?) "
+            "ON CONFLICT (sha256) DO UPDATE SET refcount = refcount + 1, last_used_at = excluded.last_used_at",
+            (sha256, path, size, now, now)
+        )
+    return path, deduplicated
+
+
+def _release(sha256: str, keep_until: float = None):
+    with outbox_db.transaction() as conn:
+        conn.execute(
+            "UPDATE blobs SET refcount = MAX(refcount - 1, 0), last_used_at = ?, "
+            "keep_until = MAX(COALESCE(keep_until, 0), COALESCE(?, 0)) WHERE sha256 = ?",
+            (time.time(), keep_until, sha256)
+        )
+
+
+def _sweep(retention_days: float = RESUME_RETENTION_DAYS, quota_mb: float = RESUME_STORE_QUOTA_MB):
+    """Delete unreferenced resumes past retention, then more until the store fits its quota
+
+    Returns (deleted count, freed bytes). Referenced resumes, and ones kept
+    for a download link that is still valid, are never deleted.
+    """
+    now = time.time()
+    deleted, freed = 0, 0
+    with outbox_db.transaction() as conn:
+        expired = conn.execute(
+            "DELETE FROM blobs WHERE refcount = 0 AND last_used_at < ? AND COALESCE(keep_until, 0) < ? RETURNING sha256, path, size",
+            (now - retention_days * 86400, now)
+        ).fetchall()
+        victims = list(expired)
+        if quota_mb:
+            quota = quota_mb * 1024 * 1024
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+            if total > quota:
+                for row in conn.execute(
+                    "SELECT sha256, path, size FROM blobs WHERE refcount = 0 AND COALESCE(keep_until, 0) < ? "
+                    "ORDER BY last_used_at", (now,)
+                ).fetchall():
+                    if total <= quota:
+                        break
+                    conn.execute("DELETE FROM blobs WHERE sha256 = ?", (row["sha256"],))
+                    victims.append(row)
+                    total -= row["size"]
+                if total > quota:
+                    logger.warning(f"Resume store is over its {quota_mb:g} MB quota with only referenced or linked resumes left")
+
+    # The files are removed after the rows, in small batches, so the outbox is never locked for a
+    # whole eviction. A resume stored again since its row was deleted has a new row; keep its file.
+    for start in range(0, len(victims), _UNLINK_BATCH):
+        with outbox_db.transaction() as conn:
+            for row in victims[start:start + _UNLINK_BATCH]:
+                deleted += 1
+                freed += row["size"]
+                if conn.execute("SELECT 1 FROM blobs WHERE sha256 = ?", (row["sha256"],)).fetchone():
+                    continue
+                try:
+                    os.remove(row["path"])
+                    os.rmdir(os.path.dirname(row["path"]))
+                except OSError:
+                    # Already gone, or its directory still holds other resumes
+                    pass
+
+    if os.path.isdir(_STAGING_DIR):
+        for entry in os.scandir(_STAGING_DIR):
+            if entry.stat().st_mtime < now - _STAGING_MAX_AGE:
+                os.remove(entry.path)
+    return deleted, freed
+
+
+class ResumeStore:
+    """Content-addressed, reference-counted resume storage with a background retention sweeper
+
+    Identical resumes are stored once under their SHA-256. Every queued
+    message that attaches a resume holds a reference, released by the outbox
+    once it is delivered, so the file survives retries. Unreferenced resumes
+    are kept for the retention window and within the disk quota.
+    """
+
+    def __init__(self, sweep_interval: float = RESUME_SWEEP_INTERVAL):
+        self.sweep_interval = sweep_interval
+        self._task = None
+
+    async def store(self, upload, max_bytes: int = MAX_RESUME_BYTES):
+        """Stream an upload into the store, returning (path, size, sha256) with one reference held"""
+        staged_path = os.path.join(_STAGING_DIR, f"{uuid.uuid4()}.part")
+        size, sha256 = await save_upload(upload, staged_path, max_bytes)
+        try:
+            path, deduplicated = await asyncio.to_thread(_put, staged_path, size, sha256)
+        except BaseException:
+            if os.path.exists(staged_path):
+                os.remove(staged_path)
+            raise
+        if deduplicated:
+            logger.info("Resume %s is already stored, reusing it", sha256)
+        return path, size, sha256
+
+    async def release(self, sha256: str, keep_until: float = None):
+        """Drop a reference taken by store() that was not handed to a queued message
+
+        With keep_until (a Unix time) the resume is not deleted before then,
+        for resumes HR downloads through a link rather than an attachment.
+        """
+        await asyncio.to_thread(_release, sha256, keep_until)
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                start = time.perf_counter()
+                deleted, freed = await asyncio.to_thread(_sweep)
+                observe("resume_sweep_seconds", time.perf_counter() - start)
+                if deleted:
+                    logger.info(f"Resume sweeper deleted {deleted} resumes ({freed / (1024 * 1024):.1f} MB)")
+            except Exception as e:
+                logger.error(f"Resume sweep failed: {str(e)}")
+            await asyncio.sleep(self.sweep_interval)
+
+
+resume_store = ResumeStore()
@@ -0,0 +1,56 @@
+import re
+import zipfile
+from xml.etree import ElementTree
+
+from pypdf import PdfReader
+
+# Kept small on purpose: this module is what the extraction worker processes import
+
+# Extracted text beyond this many characters is not indexed
+MAX_TEXT_CHARS = 200_000
+
+_WORD_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+# Runs of printable characters in a legacy .doc file
+_DOC_TEXT = re.compile(rb"[\x20-\x7e\r\n\t]{4,}")
+
+
+def _pdf_text(path: str) -> str:
+    reader = PdfReader(path)
+    parts, length = [], 0
+    for page in reader.pages:
+        text = page.extract_text() or ""
+        parts.append(text)
+        length += len(text)
+        if length >= MAX_TEXT_CHARS:
+            break
+    return "\n".join(parts)
+
+
+def _docx_text(path: str) -> str:
+    with zipfile.ZipFile(path) as archive:
+        root = ElementTree.fromstring(archive.read("word/document.xml"))
+    paragraphs = []
+    for paragraph in root.iter(f"{_WORD_NS}p"):
+        paragraphs.append("".join(node.text or "" for node in paragraph.iter(f"{_WORD_NS}t")))
+    return "\n".join(paragraphs)
+
+
+def _doc_text(path: str) -> str:
+    # Word 97 files keep their text as plain runs; good enough for search
+    with open(path, "rb") as f:
+        data = f.read()
+    return "\n".join(run.decode("ascii").strip() for run in _DOC_TEXT.findall(data))
+
+
+def extract_text(path: str, filename: str) -> str:
+    """Plain text of a PDF, DOCX or DOC resume, for the search index"""
+    extension = filename.rsplit(".", 1)[-1].lower()
+    if extension == "pdf":
+        text = _pdf_text(path)
+    elif extension == "docx":
+        text = _docx_text(path)
+    elif extension == "doc":
+        text = _doc_text(path)
+    else:
+        return ""
+    return " ".join(text.split())[:MAX_TEXT_CHARS]
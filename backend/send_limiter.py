@@ -0,0 +1,85 @@
+import os
+import sqlite3
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Outbound send rate shared by every thread and uvicorn worker on this host
+DATA_DIR = os.getenv("DATA_DIR", "data")
+MAIL_RATE_DB = os.getenv("MAIL_RATE_DB", os.path.join(DATA_DIR, "send_rate.db"))
+# Messages per second; 0 turns the limiter off
+MAIL_RATE = float(os.getenv("MAIL_RATE", "1"))
+# Messages that may go out back to back after an idle period
+MAIL_BURST = float(os.getenv("MAIL_BURST", "5"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS token_bucket (
+    name TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL
+)
+"""
+
+
+class TokenBucket:
+    """Token bucket whose state lives in SQLite so separate processes share one budget
+
+    Each acquire() reserves a token in a single short write transaction. When
+    the bucket is empty the reservation still succeeds, leaving a deficit, and
+    the caller sleeps until its token would have been refilled. Callers only
+    wait when the budget is actually exhausted, and concurrent callers queue
+    up one interval apart instead of polling.
+    """
+
+    def __init__(self, path: str, rate: float, burst: float, name: str = "smtp"):
+        self.path = path
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.name = name
+        self._local = threading.local()
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def _reserve(self) -> float:
+        """Take one token, returning how long to wait before using it"""
+        conn = self._connect()
+        now = time.time()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT tokens, updated_at FROM token_bucket WHERE name = ?", (self.name,)
+            ).fetchone()
+            tokens = self.burst if row is None else min(self.burst, row[0] + (now - row[1]) * self.rate)
+            tokens -= 1
+            conn.execute(
+                "INSERT OR REPLACE INTO token_bucket (name, tokens, updated_at) VALUES (?, ?, ?)",
+                (self.name, tokens, now)
+            )
+        return 0.0 if tokens >= 0 else -tokens / self.rate
+
+    def acquire(self) -> float:
+        """Block until a send is allowed, returning the seconds waited"""
+        if self.rate <= 0:
+            return 0.0
+        try:
+            wait = self._reserve()
+        except sqlite3.Error as e:
+            # Never drop mail because the limiter is unavailable
+            logger.warning(f"Send rate limiter unavailable, sending without it: {str(e)}")
+            return 0.0
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+send_limiter = TokenBucket(MAIL_RATE_DB, MAIL_RATE, MAIL_BURST)
@@ -0,0 +1,96 @@
+import smtplib
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class SMTPPool:
+    """Keeps authenticated SMTP sessions open so consecutive emails can reuse them"""
+
+    def __init__(self, connect, max_size: int = 4, idle_timeout: float = 60.0):
+        # connect() must return a connected, logged-in smtplib.SMTP instance
+        self._connect = connect
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self._idle = []  # (server, last_used) pairs, most recently used last
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+
+    def _acquire(self):
+        self._slots.acquire()
+        try:
+            while True:
+                with self._lock:
+                    if not self._idle:
+                        break
+                    server, last_used = self._idle.pop()
+                if time.monotonic() - last_used > self.idle_timeout:
+                    logger.info("Closing SMTP session idle for longer than %ss", self.idle_timeout)
+                    self._close(server)
+                    continue
+                if self._is_alive(server):
+                    return server
+                self._close(server)
+            logger.info("Opening new SMTP session")
+            return self._connect()
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _release(self, server):
+        with self._lock:
+            self._idle.append((server, time.monotonic()))
+        self._slots.release()
+
+    def _discard(self, server):
+        self._close(server)
+        self._slots.release()
+
+    @staticmethod
+    def _is_alive(server) -> bool:
+        """NOOP health check before a pooled session is reused"""
+        try:
+            return server.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    @staticmethod
+    def _close(server):
+        try:
+            server.quit()
+        except (smtplib.SMTPException, OSError):
+            server.close()
+
+    def send(self, deliver):
+        """Call deliver(server) on a pooled session, reconnecting once if the server dropped it
+
+        deliver may run twice, so it must be safe to repeat (e.g. rewind its input first).
+        """
+        for attempt in range(2):
+            server = self._acquire()
+            try:
+                refused = deliver(server)
+            except smtplib.SMTPServerDisconnected:
+                self._discard(server)
+                if attempt:
+                    raise
+                logger.warning("SMTP session was disconnected, reconnecting")
+                continue
+            except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused):
+                # smtplib resets the transaction on these, so the session is still usable
+                self._release(server)
+                raise
+            except BaseException:
+                self._discard(server)
+                raise
+            self._release(server)
+            return refused
+
+    def close(self):
+        """Close every idle session"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for server, _ in idle:
+            self._close(server)
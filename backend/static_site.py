@@ -0,0 +1,171 @@
+import asyncio
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import logging
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from file_responses import etag_matches, file_response
+
+logger = logging.getLogger(__name__)
+
+# Static frontend configuration
+# Built frontend to serve from this app (e.g. ../frontend/dist); unset leaves it to a separate server
+FRONTEND_DIST_DIR = os.getenv("FRONTEND_DIST_DIR", "")
+# Files up to this size are held in memory; larger ones are streamed from disk
+STATIC_MEMORY_MAX_BYTES = int(os.getenv("STATIC_MEMORY_MAX_BYTES", str(1024 * 1024)))
+
+# Vite names build output assets/<name>-<content hash>.<ext>, so those files never change
+_HASHED = re.compile(r"assets/.+-[A-Za-z0-9_-]{8,}\.\w+")
+_IMMUTABLE = "public, max-age=31536000, immutable"
+# Everything else (index.html, files from public/) is revalidated with its ETag on every use
+_REVALIDATE = "no-cache"
+
+# Precompressed siblings written by frontend/scripts/precompress.js, in order of preference
+_ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+_COMPRESSIBLE = re.compile(r"\.(html|js|mjs|css|json|svg|txt|xml|map|ico|webmanifest)$")
+# Smaller files gain nothing from compression
+_MIN_COMPRESS_SIZE = 1024
+
+mimetypes.add_type("application/manifest+json", ".webmanifest")
+
+
+class Representation:
+    """The bytes of one file in one content encoding, with their strong ETag"""
+
+    def __init__(self, path: str, data: bytes, keep_in_memory: bool):
+        self.path = path
+        self.size = len(data)
+        self.etag = f'"{hashlib.sha256(data).hexdigest()[:32]}"'
+        self.body = data if keep_in_memory else None
+
+
+class Asset:
+    """A file of the built frontend with its precompressed variants"""
+
+    def __init__(self, media_type: str, cache_control: str):
+        self.media_type = media_type
+        self.cache_control = cache_control
+        self.encodings = {}
+
+
+def accepted_encodings(header: str):
+    """Content codings an Accept-Encoding header allows (q-value above zero)"""
+    accepted = set()
+    for item in (header or "").split(","):
+        coding, _, params = item.partition(";")
+        q = 1.0
+        params = params.strip().replace(" ", "")
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if q > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def _read(path: str):
+    with open(path, "rb") as f:
+        data = f.read()
+    return Representation(path, data, len(data) <= STATIC_MEMORY_MAX_BYTES), data
+
+
+def build_index(directory: str):
+    """Map every URL path under directory to its Asset, reading and hashing each file once"""
+    index = {}
+    for root, _, filenames in os.walk(directory):
+        for filename in filenames:
+            if filename.endswith((".br", ".gz")):
+                continue
+            path = os.path.join(root, filename)
+            url_path = os.path.relpath(path, directory).replace(os.sep, "/")
+            asset = Asset(
+                mimetypes.guess_type(filename)[0] or "application/octet-stream",
+                _IMMUTABLE if _HASHED.fullmatch(url_path) else _REVALIDATE
+            )
+            identity, data = _read(path)
+            asset.encodings["identity"] = identity
+            for encoding, suffix in _ENCODINGS:
+                if os.path.exists(path + suffix):
+                    asset.encodings[encoding] = _read(path + suffix)[0]
+            # Build without precompress.js: gzip the small text files here, once
+            if ("gzip" not in asset.encodings and _COMPRESSIBLE.search(filename)
+                    and _MIN_COMPRESS_SIZE <= identity.size <= STATIC_MEMORY_MAX_BYTES):
+                asset.encodings["gzip"] = Representation(path, gzip.compress(data, mtime=0), True)
+            index[url_path] = asset
+    return index
+
+
+class StaticSite:
+    """ASGI app serving the built frontend from an index built at startup
+
+    Requests are answered from the in-memory index without touching file
+    metadata: the representation is chosen by Accept-Encoding among the
+    precompressed variants, revalidated with its strong ETag, and sent from
+    memory (or streamed from disk when large). Paths that are not files fall
+    back to index.html so client-side routes work.
+    """
+
+    def __init__(self, directory: str = FRONTEND_DIST_DIR):
+        self.directory = directory
+        self._index = {}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory)
+
+    async def start(self):
+        if not self.enabled:
+            return
+        if not os.path.isfile(os.path.join(self.directory, "index.html")):
+            logger.error(f"FRONTEND_DIST_DIR {self.directory} has no index.html; build the frontend first")
+            return
+        self._index = await asyncio.to_thread(build_index, self.directory)
+        size = sum(asset.encodings["identity"].size for asset in self._index.values())
+        logger.info(f"Serving {len(self._index)} frontend files ({size / 1024:.0f} KB) from {self.directory}")
+
+    def _lookup(self, path: str):
+        path = path.lstrip("/")
+        asset = self._index.get(path or "index.html") or self._index.get(path.rstrip("/") + "/index.html")
+        if asset is None and not path.startswith("api/") and "." not in path.rsplit("/", 1)[-1]:
+            # A client-side route of the single-page app
+            asset = self._index.get("index.html")
+        return asset
+
+    async def __call__(self, scope, receive, send):
+        if scope.get("method") not in ("GET", "HEAD"):
+            response = Response("Method Not Allowed", status_code=405, headers={"Allow": "GET, HEAD"})
+        else:
+            response = self.respond(scope)
+        await response(scope, receive, send)
+
+    def respond(self, scope):
+        asset = self._lookup(scope["path"])
+        if asset is None:
+            return Response("Not Found", status_code=404, media_type="text/plain")
+        request = Request(scope)
+        accepted = accepted_encodings(request.headers.get("accept-encoding"))
+        encoding = next((e for e in ("br", "gzip") if e in asset.encodings and (e in accepted or "*" in accepted)), "identity")
+        representation = asset.encodings[encoding]
+
+        headers = {"Cache-Control": asset.cache_control}
+        if len(asset.encodings) > 1:
+            headers["Vary"] = "Accept-Encoding"
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+
+        if representation.body is None:
+            return file_response(request, representation.path, representation.size, representation.etag, asset.media_type, headers)
+        headers["ETag"] = representation.etag
+        if etag_matches(request.headers.get("if-none-match"), representation.etag):
+            return Response(status_code=304, headers=headers)
+        return Response(representation.body, media_type=asset.media_type, headers=headers)
+
+
+static_site = StaticSite()
@@ -0,0 +1,131 @@
+import html
+import os
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Directory holding <name>.html / <name>.txt email templates and their layouts
+EMAIL_TEMPLATE_DIR = os.getenv(
+    "EMAIL_TEMPLATE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "email_templates")
+)
+
+# {{ field }} or {{ field|filter }}
+_FIELD = re.compile(r"\{\{\s*(\w+)\s*(?:\|\s*(\w+)\s*)?\}\}")
+# Where a template body is inserted into its layout
+_CONTENT_SLOT = "{% content %}"
+
+
+def _nl2br(value: str) -> str:
+    return html.escape(value).replace("\r\n", "\n").replace("\n", "<br>\n")
+
+
+_HTML_FILTERS = {
+    None: html.escape,
+    "raw": str,
+    "nl2br": _nl2br,
+}
+_TEXT_FILTERS = {
+    None: str,
+    "raw": str,
+    "nl2br": str,
+}
+
+
+class Template:
+    """A template parsed once into static segments and field lookups
+
+    Rendering is a single join over the precomputed segments; there is no
+    parsing or string formatting of the static text per call.
+    """
+
+    def __init__(self, source: str, autoescape: bool = True):
+        filters = _HTML_FILTERS if autoescape else _TEXT_FILTERS
+        self._static = []
+        self._fields = []
+        pos = 0
+        for match in _FIELD.finditer(source):
+            name, filter_name = match.group(1), match.group(2)
+            if filter_name not in filters:
+                raise ValueError(f"Unknown template filter '{filter_name}'")
+            self._static.append(source[pos:match.start()])
+            self._fields.append((name, filters[filter_name]))
+            pos = match.end()
+        self._static.append(source[pos:])
+        self.fields = frozenset(name for name, _ in self._fields)
+
+    def render(self, context: dict) -> str:
+        parts = [self._static[0]]
+        for (name, apply_filter), static in zip(self._fields, self._static[1:]):
+            parts.append(apply_filter(str(context[name])))
+            parts.append(static)
+        return "".join(parts)
+
+
+class TemplateSet:
+    """Email templates loaded and compiled from a directory
+
+    Each email is a pair of files, <name>.html and <name>.txt. Both are
+    merged into layout.html / layout.txt at load time, so the shared
+    boilerplate and CSS become part of one precompiled skeleton. Files
+    named _<name> are partials and are compiled without the layout.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._templates = {}
+
+    def _read(self, filename: str):
+        path = os.path.join(self.directory, filename)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+
+    def load(self):
+        """(Re)compile every template in the directory"""
+        layouts = {ext: self._read(f"layout.{ext}") or _CONTENT_SLOT for ext in ("html", "txt")}
+        templates = {}
+        for filename in sorted(os.listdir(self.directory)):
+            name, ext = os.path.splitext(filename)
+            ext = ext.lstrip(".")
+            if name == "layout" or ext not in layouts:
+                continue
+            source = self._read(filename).rstrip("\n")
+            # Partials (leading underscore) are fragments rendered into other templates
+            if not name.startswith("_"):
+                source = layouts[ext].replace(_CONTENT_SLOT, source)
+            templates.setdefault(name, {})[ext] = Template(source, autoescape=(ext == "html"))
+        self._templates = templates
+        logger.info(f"Compiled {len(templates)} email templates from {self.directory}")
+        return self
+
+    def render(self, template_name: str, /, **context):
+        """Render a template, returning (html, text); text is None without a .txt file"""
+        pair = self._templates[template_name]
+        html_body = pair["html"].render(context)
+        text_body = pair["txt"].render(context) if "txt" in pair else None
+        return html_body, text_body
+
+    def render_with(self, template_name: str, /, prerendered: dict, **context):
+        """render() with some fields already rendered from partials
+
+        prerendered maps a field to the (html, text) pair of a partial, or to a
+        list of pairs, joined one per line in HTML and by blank lines in text.
+        The template has to insert these fields with the raw filter.
+        """
+        html_fields, text_fields = {}, {}
+        for field, value in prerendered.items():
+            if isinstance(value, list):
+                html_fields[field] = "\n".join(html_part for html_part, _ in value)
+                text_fields[field] = "\n\n".join(text_part for _, text_part in value)
+            else:
+                html_fields[field], text_fields[field] = value
+        pair = self._templates[template_name]
+        html_body = pair["html"].render({**context, **html_fields})
+        text_body = pair["txt"].render({**context, **text_fields}) if "txt" in pair else None
+        return html_body, text_body
+
+
+templates = TemplateSet(EMAIL_TEMPLATE_DIR).load()
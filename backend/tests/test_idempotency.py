@@ -0,0 +1,65 @@
+import asyncio
+import json
+
+from fastapi.responses import JSONResponse
+
+from idempotency import IdempotencyCache
+
+
+def test_failed_attempt_is_retried_by_one_duplicate():
+    cache = IdempotencyCache(backend="memory")
+    calls = []
+    first_started = asyncio.Event()
+    release_first = asyncio.Event()
+
+    async def handler():
+        calls.append(len(calls) + 1)
+        if len(calls) == 1:
+            first_started.set()
+            await release_first.wait()
+            return JSONResponse(status_code=500, content={"success": False})
+        await asyncio.sleep(0.01)
+        return JSONResponse(status_code=202, content={"success": True, "id": len(calls)})
+
+    async def scenario():
+        first = asyncio.create_task(cache.run("key", handler))
+        await first_started.wait()
+        # Three duplicates arrive while the first attempt is still running, which then fails
+        duplicates = [asyncio.create_task(cache.run("key", handler)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        release_first.set()
+        return await asyncio.wait_for(asyncio.gather(first, *duplicates), timeout=5)
+
+    results = asyncio.run(scenario())
+
+    assert results[0][0].status_code == 500
+    # Exactly one duplicate takes over; the others get its response replayed instead of running again
+    assert len(calls) == 2
+    duplicates = results[1:]
+    assert sorted(replayed for _, replayed in duplicates) == [False, True, True]
+    assert {json.loads(response.body)["id"] for response, _ in duplicates} == {2}
+    assert cache._inflight == {}
+
+
+def test_handler_error_wakes_waiting_duplicates():
+    cache = IdempotencyCache(backend="memory")
+    calls = []
+
+    async def handler():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        if len(calls) == 1:
+            raise RuntimeError("SMTP down")
+        return JSONResponse(status_code=202, content={"success": True})
+
+    async def scenario():
+        return await asyncio.wait_for(
+            asyncio.gather(*(cache.run("key", handler) for _ in range(3)), return_exceptions=True),
+            timeout=5
+        )
+
+    results = asyncio.run(scenario())
+
+    assert isinstance(results[0], RuntimeError)
+    assert [replayed for _, replayed in results[1:]] == [False, True]
+    assert len(calls) == 2
@@ -0,0 +1,54 @@
+import pytest
+
+from smtp_transport import Transport, TransportSelector, TransportsUnavailable
+
+
+class FakeTransport(Transport):
+    """Transport whose connect succeeds or fails on demand, without a network"""
+
+    def __init__(self, port: int):
+        super().__init__("none", "smtp.test", port)
+        self.up = True
+        self.attempts = 0
+
+    def connect(self, connect_timeout: float, send_timeout: float):
+        self.attempts += 1
+        if not self.up:
+            raise ConnectionRefusedError(f"{self.name} is down")
+        return f"session via {self.name}"
+
+
+def test_unreached_half_open_transport_is_not_left_probing():
+    primary, backup = FakeTransport(1), FakeTransport(2)
+    # No cool-down, so a tripped transport is half-open again at once
+    selector = TransportSelector([primary, backup], threshold=1, cooldown=0)
+
+    primary.up = backup.up = False
+    with pytest.raises(ConnectionRefusedError):
+        selector.connect()
+    assert primary.failures == backup.failures == 1
+
+    # Both are half-open; the primary's probe succeeds, so the backup is never tried
+    primary.up = backup.up = True
+    assert selector.connect() == "session via none://smtp.test:1"
+    assert backup.attempts == 1
+    assert not backup.probing
+
+    # The backup still gets its probe once the primary goes down again
+    primary.up = False
+    assert selector.connect() == "session via none://smtp.test:2"
+    assert backup.failures == 0
+
+
+def test_transport_being_probed_is_skipped():
+    primary, backup = FakeTransport(1), FakeTransport(2)
+    selector = TransportSelector([primary, backup], threshold=1, cooldown=0)
+    primary.up = backup.up = False
+    with pytest.raises(ConnectionRefusedError):
+        selector.connect()
+
+    # Another caller is probing both; this one must not pile onto them
+    primary.probing = backup.probing = True
+    with pytest.raises(TransportsUnavailable):
+        selector.connect()
+    assert primary.attempts == backup.attempts == 1
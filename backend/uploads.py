@@ -0,0 +1,52 @@
+import hashlib
+import os
+import logging
+
+import aiofiles
+from fastapi import UploadFile
+
+logger = logging.getLogger(__name__)
+
+# Upload configuration
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
+MAX_RESUME_BYTES = int(os.getenv("MAX_RESUME_BYTES", str(10 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(64 * 1024)))
+
+
+class UploadTooLarge(Exception):
+    """Raised when an upload exceeds its size limit"""
+
+    def __init__(self, limit: int):
+        super().__init__(f"Upload exceeds the {limit} byte limit")
+        self.limit = limit
+
+
+async def save_upload(upload: UploadFile, file_path: str, max_bytes: int = MAX_RESUME_BYTES):
+    """Stream an upload to disk in fixed-size chunks, hashing it on the way
+
+    Returns (size, sha256 hex digest). Stops as soon as max_bytes is exceeded
+    and removes the partial file, so memory use never grows past one chunk.
+    """
+    # The multipart parser already knows the size of spooled uploads
+    if upload.size is not None and upload.size > max_bytes:
+        raise UploadTooLarge(max_bytes)
+
+    os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(file_path, 'wb') as f:
+            while True:
+                chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(max_bytes)
+                digest.update(chunk)
+                await f.write(chunk)
+    except BaseException:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        raise
+    return size, digest.hexdigest()
@@ -0,0 +1,27 @@
+// Writes .br and .gz copies of the compressible files in dist/ so the backend
+// can serve them as-is (see backend/static_site.py) instead of compressing per request.
+import { brotliCompressSync, gzipSync, constants } from 'node:zlib'
+import { readdirSync, readFileSync, writeFileSync } from 'node:fs'
+import { join } from 'node:path'
+
+const DIST = new URL('../dist/', import.meta.url).pathname
+const COMPRESSIBLE = /\.(html|js|mjs|css|json|svg|txt|xml|map|ico|webmanifest)$/
+// Smaller files gain nothing from compression
+const MIN_SIZE = 1024
+
+let count = 0
+for (const entry of readdirSync(DIST, { recursive: true, withFileTypes: true })) {
+  const path = join(entry.parentPath ?? entry.path, entry.name)
+  if (!entry.isFile() || !COMPRESSIBLE.test(entry.name)) continue
+  const data = readFileSync(path)
+  if (data.length < MIN_SIZE) continue
+  writeFileSync(`${path}.br`, brotliCompressSync(data, {
+    params: {
+      [constants.BROTLI_PARAM_QUALITY]: constants.BROTLI_MAX_QUALITY,
+      [constants.BROTLI_PARAM_SIZE_HINT]: data.length,
+    },
+  }))
+  writeFileSync(`${path}.gz`, gzipSync(data, { level: 9 }))
+  count++
+}
+console.log(`precompress: wrote .br and .gz for ${count} files in dist/`)
@@ -32,7 +32,7 @@ export const submitJobApplication = async (applicationData, resumeFile) => {
     const result = await response.json();
     
     if (!response.ok) {
-      throw new Error(result.detail || 'Failed to submit application');
+      throw new Error(result.detail || result.message || 'Failed to submit application');
     }
     
     return result;
@@ -60,7 +60,7 @@ export const submitContactForm = async (contactData) => {
     const result = await response.json();
     
     if (!response.ok) {
-      throw new Error(result.detail || 'Failed to submit contact form');
+      throw new Error(result.detail || result.message || 'Failed to submit contact form');
     }
     
     return result;